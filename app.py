@@ -1,14 +1,22 @@
 #Importing necessary libraries explained in libraries section
-import requests
 import random
-from flask import Flask, url_for, request, render_template, redirect, flash, session #make_response
+from flask import Flask, url_for, request, render_template, redirect, flash, session, Response #make_response
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.schema import CreateColumn
 from markupsafe import escape
 from flask_bcrypt import Bcrypt
 from scraper import Scraper
+from transfers import PositionColumns, SuggestTransfers, Thresholds, GetCandidateLists, PlanTransfers
+from optimizer import OptimizeSquad
+from lineup import GetSquadStats, GetTeamStats, ScoreCaptains, PickCaptains, RecommendStartingXI, LoadPlayerData
+from league import FetchLeague, AnalyseLeague
+from live import LiveFeed
+from pagecache import PageCache
 from flask_login import logout_user, LoginManager, UserMixin, login_user, login_required, current_user
 from collections import defaultdict
+import metrics
 import os
 
 #Initialize flask 
@@ -22,7 +30,7 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = True
 app.config['SQLALCHEMY_ECHO'] = False
 basedir = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.join(basedir, 'fplhelper.db')  
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL", f'sqlite:///{db_path}')
 
 #Initialize Flask extensions
 login_manager = LoginManager()
@@ -32,10 +40,30 @@ db = SQLAlchemy(app)
 bcrypt = Bcrypt(app)
 migrate = Migrate(app, db)
 
-#Initializing scraper in app
-scraper = Scraper()
-
-FPL_API_URL = "https://fantasy.premierleague.com/api/bootstrap-static/"
+# FPL_SQLITE_BUSY_TIMEOUT is how many milliseconds a connection waits for another writer before giving up
+SQLiteBusyTimeout = int(os.getenv("FPL_SQLITE_BUSY_TIMEOUT", 5000))
+
+def ConfigureSQLite(DBAPIConnection, ConnectionRecord):
+    # WAL lets pages keep reading while the autoscraper writes, and NORMAL only syncs at checkpoints, which is safe under WAL
+    Cursor = DBAPIConnection.cursor()
+    Cursor.execute("PRAGMA journal_mode=WAL")
+    Cursor.execute(f"PRAGMA busy_timeout={SQLiteBusyTimeout}")
+    Cursor.execute("PRAGMA synchronous=NORMAL")
+    Cursor.close()
+
+#Initializing scraper in app, with FPL responses cached on disk between restarts
+FPLCacheDir = os.getenv("FPL_CACHE_DIR", os.path.join(basedir, 'fplcache'))
+# Held by the one running refresh scheduler, see scheduler.py
+FPLSchedulerLock = os.getenv("FPL_SCHEDULER_LOCK", os.path.join(basedir, 'fplscheduler.lock'))
+# FPL_CASSETTE with FPL_CASSETTE_MODE=record or replay captures or plays back every FPL response
+FPLCassette = os.getenv("FPL_CASSETTE")
+FPLCassetteMode = os.getenv("FPL_CASSETTE_MODE", "replay")
+# FPL_RATE_LIMIT caps upstream requests a second across every thread, 0 turns the limit off
+scraper = Scraper(CacheDir=FPLCacheDir, CassettePath=FPLCassette, CassetteMode=FPLCassetteMode, RateLimit=float(os.getenv("FPL_RATE_LIMIT", 20)))
+# Live points for open team pages, one poll of the live endpoint serves every page
+livefeed = LiveFeed(scraper, Interval=int(os.getenv("FPL_LIVE_INTERVAL", 30)))
+
+FPL_API_URL = f"{scraper.base}bootstrap-static/"
 
 #Database models
 class FPLTeams(db.Model):
@@ -72,9 +100,9 @@ class RealTeams(db.Model):
 class Players(db.Model):
     __tablename__ = 'Players'
     PlayerID = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    TeamID = db.Column(db.Integer, db.ForeignKey('RealTeams.TeamID'), nullable=False)
-    Name = db.Column(db.String(30), nullable=False)
-    Position = db.Column(db.Integer, nullable=False)
+    TeamID = db.Column(db.Integer, db.ForeignKey('RealTeams.TeamID'), nullable=False, index=True)
+    Name = db.Column(db.String(30), nullable=False, index=True)
+    Position = db.Column(db.Integer, nullable=False, index=True)
     Price = db.Column(db.Float, nullable=False)
 
     RealTeam = db.relationship('RealTeams', back_populates='Players')
@@ -82,18 +110,18 @@ class Players(db.Model):
 class PlayerStats(db.Model):
     __tablename__ = 'PlayerStats'
     PlayerID = db.Column(db.Integer, db.ForeignKey('Players.PlayerID'), primary_key=True)
-    CurrentGameweek = db.Column(db.Integer, nullable=False)
+    CurrentGameweek = db.Column(db.Integer, nullable=False, index=True)
     TeamRecentPoints = db.Column(db.Integer, nullable=False)
     NextFixtureDifficulty = db.Column(db.Integer, nullable=True)
-    Goals = db.Column(db.Integer, nullable=False)
-    Assists = db.Column(db.Integer, nullable=False)
-    Points = db.Column(db.Integer, nullable=False)
-    xG = db.Column(db.Float, nullable=False)
-    xA = db.Column(db.Float, nullable=False)
+    Goals = db.Column(db.Integer, nullable=False, index=True)
+    Assists = db.Column(db.Integer, nullable=False, index=True)
+    Points = db.Column(db.Integer, nullable=False, index=True)
+    xG = db.Column(db.Float, nullable=False, index=True)
+    xA = db.Column(db.Float, nullable=False, index=True)
     RecentGoals = db.Column(db.Integer, nullable=False)
     RecentAssists = db.Column(db.Integer, nullable=False)
-    RecentPoints = db.Column(db.Integer, nullable=False)
-    CleanSheets = db.Column(db.Integer, nullable=False)
+    RecentPoints = db.Column(db.Integer, nullable=False, index=True)
+    CleanSheets = db.Column(db.Integer, nullable=False, index=True)
     Saves = db.Column(db.Integer, nullable=False)
     PenaltySaves = db.Column(db.Integer, nullable=False)
     YellowCards = db.Column(db.Integer, nullable=False)
@@ -104,12 +132,173 @@ class PlayerStats(db.Model):
     LastSeasonGoals = db.Column(db.Integer, nullable=False)
     LastSeasonAssists = db.Column(db.Integer, nullable=False)
     LastSeasonCleanSheets = db.Column(db.Integer, nullable=False)
+    Minutes = db.Column(db.Integer, nullable=False, server_default='0')
+    GoalsConceded = db.Column(db.Integer, nullable=False, server_default='0')
+    Bonus = db.Column(db.Integer, nullable=False, server_default='0')
+    Bps = db.Column(db.Integer, nullable=False, server_default='0')
+    ICTIndex = db.Column(db.Float, nullable=False, server_default='0')
+    Starts = db.Column(db.Integer, nullable=False, server_default='0')
+    xGC = db.Column(db.Float, nullable=False, server_default='0')
 
     Player = db.relationship('Players', backref='stats', uselist=False)
 
-# Create the database and tables if they don't exist
+class PlayerFingerprints(db.Model):
+    __tablename__ = 'PlayerFingerprints'
+    # Bootstrap-static values last written to PlayerStats, used by incremental refreshes to skip unchanged players
+    PlayerID = db.Column(db.Integer, db.ForeignKey('Players.PlayerID'), primary_key=True)
+    Fingerprint = db.Column(db.String(64), nullable=False)
+
+class PlayerRankings(db.Model):
+    __tablename__ = 'PlayerRankings'
+    # Rank-sum transfer scores against the player's whole position, recomputed by the autoscraper after each refresh
+    PlayerID = db.Column(db.Integer, db.ForeignKey('Players.PlayerID'), primary_key=True)
+    Position = db.Column(db.Integer, nullable=False)
+    Score = db.Column(db.Float, nullable=False)
+    RecentPointsRank = db.Column(db.Integer, nullable=True)
+    xGRank = db.Column(db.Integer, nullable=True)
+    xARank = db.Column(db.Integer, nullable=True)
+    RecentGoalsRank = db.Column(db.Integer, nullable=True)
+    RecentAssistsRank = db.Column(db.Integer, nullable=True)
+    TeamRecentPointsRank = db.Column(db.Integer, nullable=True)
+    CleanSheetsRank = db.Column(db.Integer, nullable=True)
+    SavesRank = db.Column(db.Integer, nullable=True)
+    PenaltySavesRank = db.Column(db.Integer, nullable=True)
+    YellowCardsRank = db.Column(db.Integer, nullable=True)
+    RedCardsRank = db.Column(db.Integer, nullable=True)
+    MinutesRank = db.Column(db.Integer, nullable=True)
+    GoalsConcededRank = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (db.Index('ix_PlayerRankings_Position_Score', 'Position', 'Score'),)
+
+class DataVersions(db.Model):
+    __tablename__ = 'DataVersions'
+    # Bumped by the autoscraper each time it refreshes a table, cached pages built from an older version are rebuilt
+    Name = db.Column(db.String(30), primary_key=True)
+    Version = db.Column(db.Integer, nullable=False)
+
+class SchedulerState(db.Model):
+    __tablename__ = 'SchedulerState'
+    # Values the refresh scheduler keeps between runs, such as the last gameweek it refreshed in full
+    Name = db.Column(db.String(30), primary_key=True)
+    Value = db.Column(db.Integer, nullable=True)
+
+def LoadSquad(PlayerIDs):
+    # Load the Players, RealTeams and PlayerStats rows for a squad in one joined query, each keyed by PlayerID
+    Rows = db.session.query(Players, RealTeams, PlayerStats)\
+        .outerjoin(RealTeams, Players.TeamID == RealTeams.TeamID)\
+        .outerjoin(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
+        .filter(Players.PlayerID.in_(PlayerIDs)).all()
+
+    SquadPlayers = {}
+    SquadTeams = {}
+    SquadStats = {}
+    for Player, RealTeam, PlayerStat in Rows:
+        SquadPlayers[Player.PlayerID] = Player
+        if RealTeam:
+            SquadTeams[Player.PlayerID] = RealTeam
+        if PlayerStat:
+            SquadStats[Player.PlayerID] = PlayerStat
+    return SquadPlayers, SquadTeams, SquadStats
+
+def LoadPositionColumns(Position):
+    # Every player in a position with their stats in one query, as NumPy columns for the transfer engine
+    StatColumns = [Column for Column in PlayerStats.__table__.columns if Column.name != "PlayerID"]
+    Rows = db.session.query(Players.PlayerID, Players.Name, Players.TeamID, Players.Price, *StatColumns)\
+        .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
+        .filter(Players.Position == Position).all()
+    return PositionColumns(Position, [dict(Row._mapping) for Row in Rows])
+
+def QueryTransferSuggestions(Position, PlayerOutStats, Budget, ExcludedIDs=(), FullTeamIDs=(), TopK=5):
+    # Best precomputed scores in the position that pass the same filters as SuggestTransfers, walked through the (Position, Score) index
+    Query = db.session.query(Players.PlayerID, Players.Name, PlayerRankings.Score)\
+        .join(PlayerRankings, Players.PlayerID == PlayerRankings.PlayerID)\
+        .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
+        .filter(PlayerRankings.Position == Position,
+                Players.Price <= float(Budget),
+                Players.PlayerID.notin_(list(ExcludedIDs)),
+                Players.TeamID.notin_(list(FullTeamIDs)),
+                PlayerStats.Injured == False,
+                PlayerStats.Suspended == False)
+    for StatName in Thresholds[Position]:
+        Query = Query.filter(getattr(PlayerStats, StatName) >= getattr(PlayerOutStats, StatName))
+    Suggestions = [tuple(Row) for Row in Query.order_by(PlayerRankings.Score, PlayerRankings.PlayerID).limit(TopK).all()]
+
+    # Until the autoscraper has ranked this position, score it on the fly instead
+    if not Suggestions and PlayerRankings.query.filter_by(Position=Position).first() is None:
+        Suggestions = SuggestTransfers(LoadPositionColumns(Position), PlayerOutStats, Budget, ExcludedIDs, FullTeamIDs, TopK)
+    return Suggestions
+
+# Stats page leaderboards as name -> (column, goalkeepers only)
+ThisSeasonLeaderboards = {
+    "Goals": (PlayerStats.Goals, False),
+    "Assists": (PlayerStats.Assists, False),
+    "Points": (PlayerStats.Points, False),
+    "xG": (PlayerStats.xG, False),
+    "xA": (PlayerStats.xA, False),
+    "CleanSheets": (PlayerStats.CleanSheets, True),
+}
+LastSeasonLeaderboards = {
+    "Goals": (PlayerStats.LastSeasonGoals, False),
+    "Assists": (PlayerStats.LastSeasonAssists, False),
+    "Points": (PlayerStats.LastSeasonPoints, False),
+    "CleanSheets": (PlayerStats.LastSeasonCleanSheets, True),
+}
+
+def LoadLeaderboards(Boards, ExcludedIDs=(), Limit=25):
+    # Top players of every board in one windowed query, as name -> ([(Name, Value), ...], the leader's TeamID)
+    Values = [Column.label(Name) for Name, (Column, GoalkeepersOnly) in Boards.items()]
+    # Goalkeeper boards rank goalkeepers separately from everyone else, and only the goalkeepers' ranks are kept
+    Ranks = [db.func.row_number().over(
+                partition_by=(Players.Position == 1) if GoalkeepersOnly else None,
+                order_by=(Column.desc(), Players.PlayerID)).label(f"{Name}Rank")
+             for Name, (Column, GoalkeepersOnly) in Boards.items()]
+    Ranked = db.session.query(Players.Name, Players.TeamID, Players.Position, *Values, *Ranks)\
+        .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
+        .filter(Players.PlayerID.notin_(list(ExcludedIDs))).subquery()
+    Rows = db.session.query(Ranked).filter(db.or_(*[Ranked.c[f"{Name}Rank"] <= Limit for Name in Boards])).all()
+
+    Leaderboards = {}
+    for Name, (Column, GoalkeepersOnly) in Boards.items():
+        BoardRows = sorted((Row for Row in Rows if Row._mapping[f"{Name}Rank"] <= Limit and (not GoalkeepersOnly or Row.Position == 1)),
+                           key=lambda Row: Row._mapping[f"{Name}Rank"])
+        Leaderboards[Name] = ([(Row.Name, Row._mapping[Name]) for Row in BoardRows], BoardRows[0].TeamID if BoardRows else None)
+    return Leaderboards
+
+def UpgradeSchema():
+    # create_all never alters an existing table, so add any columns the models gained since the database was created
+    Inspector = db.inspect(db.engine)
+    with db.engine.begin() as Connection:
+        for Table in db.metadata.sorted_tables:
+            ExistingColumns = {Column['name'] for Column in Inspector.get_columns(Table.name)}
+            MissingColumns = [Column for Column in Table.columns if Column.name not in ExistingColumns]
+            for Column in MissingColumns:
+                Connection.execute(db.text(f'ALTER TABLE "{Table.name}" ADD COLUMN {CreateColumn(Column).compile(dialect=db.engine.dialect)}'))
+                print(f"Added column {Column.name} to {Table.name}")
+            if Table.name == 'PlayerStats' and MissingColumns:
+                # Existing rows only hold the defaults, so make the next incremental refresh rewrite every player
+                Connection.execute(PlayerFingerprints.__table__.delete())
+            # Nor does it add indexes, so create any the models gained
+            for TableIndex in Table.indexes:
+                TableIndex.create(Connection, checkfirst=True)
+
+# Create the database and tables if they don't exist, then bring older ones up to date
 with app.app_context():
+    # Every connection is tuned as it opens, before any of them is used
+    if db.engine.dialect.name == "sqlite":
+        event.listen(db.engine, "connect", ConfigureSQLite)
     db.create_all()   
+    UpgradeSchema()
+
+# Count and time upstream calls, SQL queries and rendering for every route
+metrics.Instrument(app, db, scraper)
+
+def GetDataVersions(Tables):
+    # Current version of each table in one query, 0 for a table the autoscraper hasn't refreshed yet
+    Versions = dict(db.session.query(DataVersions.Name, DataVersions.Version).filter(DataVersions.Name.in_(Tables)).all())
+    return tuple(Versions.get(Table, 0) for Table in Tables)
+
+# Rendered pages that only change when the database is refreshed
+pagecache = PageCache(GetDataVersions)
 
 # Get the user 
 @login_manager.user_loader
@@ -254,6 +443,7 @@ def DisplayTeam():
     
     #Initialise variables
     BestTransfer = None
+    TransferAlternatives = []
     PlayerOut = None
     Budget = None 
     NextDoubleGameweek = scraper.GetNextDoubleGameweek()
@@ -273,24 +463,23 @@ def DisplayTeam():
         TeamName = scraper.GetTeamName(TeamID)
 
 
-        TeamURL = f"https://fantasy.premierleague.com/api/entry/{TeamID}/event/{CurrentGameweek}/picks/"
-        TeamResponse = requests.get(TeamURL)
-        if TeamResponse.status_code != 200:
-            return render_template("error.html", ErrorMessage=f"Error fetching team data: {TeamResponse.status_code}")
-        TeamData = TeamResponse.json()
+        try:
+            TeamData = scraper.GetTeamPicks(TeamID, CurrentGameweek)
+        except Exception as e:
+            return render_template("error.html", ErrorMessage=f"Error fetching team data: {e}")
         PlayerIDs = [pick["element"] for pick in TeamData.get("picks", [])]
 
 
-        PlayersURL = "https://fantasy.premierleague.com/api/bootstrap-static/"
-        PlayersResponse = requests.get(PlayersURL)
-        if PlayersResponse.status_code != 200:
-            return render_template("error.html", ErrorMessage=f"Error fetching players data: {PlayersResponse.status_code}")
-        PlayersData = PlayersResponse.json()["elements"]
+        Snapshot = scraper.GetBootstrapSnapshot()
 
-        PlayersInfo = {
-            Player["id"]: {"name": Player["web_name"], "position": Player["element_type"]}
-            for Player in PlayersData if Player["id"] in PlayerIDs
-        }
+        PlayersInfo = {}
+        for PlayerID in PlayerIDs:
+            Player = Snapshot.GetPlayer(PlayerID)
+            if Player:
+                PlayersInfo[PlayerID] = {"name": Player["web_name"], "position": Player["element_type"]}
+
+        # Every section below reads the squad from these maps instead of querying per player
+        SquadPlayers, SquadTeams, SquadStats = LoadSquad(PlayerIDs)
 
         # Player details
         StartingGoalkeeper = []
@@ -325,28 +514,30 @@ def DisplayTeam():
                 BenchIDs.append(PlayerID)
         
         for PlayerID in StartingPlayerIDs:
-            Player = Players.query.filter_by(PlayerID=PlayerID).first()
+            Player = SquadPlayers.get(PlayerID)
             if Player:
-                RealTeam = RealTeams.query.filter_by(TeamID=Player.TeamID).first()
+                RealTeam = SquadTeams.get(PlayerID)
                 if RealTeam:
                     TeamName = RealTeam.Name.lower()
                     TeamName = TeamName.replace(" ", "")
                     
                 StartingPlayersDetails.append({
+                    "ID": PlayerID,
                     "Name": PlayersInfo[PlayerID]["name"],
                     "Position": "Forward" if Player.Position == 4 else "Midfielder" if Player.Position == 3 else "Defender" if Player.Position == 2 else "Goalkeeper",
                     "Team": TeamName
                 })
 
         for PlayerID in BenchIDs:
-            Player = Players.query.filter_by(PlayerID=PlayerID).first()
+            Player = SquadPlayers.get(PlayerID)
             if Player:
-                RealTeam = RealTeams.query.filter_by(TeamID=Player.TeamID).first()
+                RealTeam = SquadTeams.get(PlayerID)
                 if RealTeam:
                     TeamName = RealTeam.Name.lower()
                     TeamName = TeamName.replace(" ", "")
                     
             BenchPlayersDetails.append({
+                "ID": PlayerID,
                 "Name": PlayersInfo[PlayerID]["name"],
                 "Position": "Forward" if Player.Position == 4 else "Midfielder" if Player.Position == 3 else "Defender" if Player.Position == 2 else "Goalkeeper",
                 "Team": TeamName
@@ -356,7 +547,7 @@ def DisplayTeam():
             # Check how well the bench players are playing in user's team
             TotalBenchPoints = 0
             for Player in BenchIDs:
-                PlayerStat = PlayerStats.query.filter_by(PlayerID=Player).first()
+                PlayerStat = SquadStats.get(Player)
                 if PlayerStat:
                     TotalBenchPoints += scraper.GetLastGameweekPoints(PlayerStat.PlayerID)
                     if PlayerStat.NextFixtureDifficulty is None:
@@ -382,12 +573,15 @@ def DisplayTeam():
             else:
                 User.FPLTeamID = FPLTeam.FPLTeamID
                 db.session.commit()
-        
+
+        # Committing expires the loaded rows, reload them together rather than letting each one refresh itself
+        SquadPlayers, SquadTeams, SquadStats = LoadSquad(PlayerIDs)
+
         InjuredPlayers = []
         SuspendedPlayers = []
 
         for PlayerID in PlayerIDs:
-            PlayerStat = PlayerStats.query.filter_by(PlayerID=PlayerID).first()
+            PlayerStat = SquadStats.get(PlayerID)
             if PlayerStat:
                 if PlayerStat.Injured:
                     InjuredPlayers.append(PlayersInfo[PlayerID]["name"])
@@ -395,45 +589,9 @@ def DisplayTeam():
                     SuspendedPlayers.append(PlayersInfo[PlayerID]["name"])
         if len(InjuredPlayers) > 2 or len(SuspendedPlayers) > 2:
             UseWildcardOrFreeHit = True 
-        UserTeamStats = db.session.query(PlayerStats).filter(PlayerStats.PlayerID.in_(PlayerIDs), PlayerStats.CurrentGameweek == CurrentGameweek).all()
-        PlayerScores = []
-        UserTeamStats = [PlayerStat for PlayerStat in UserTeamStats if not PlayerStat.Injured and not PlayerStat.Suspended]
-        for PlayerStat in UserTeamStats:
-            if PlayerStat.NextFixtureDifficulty != None:
-                PlayerCaptainStats = {
-                "PlayerID": PlayerStat.PlayerID,
-                "RecentGoals": PlayerStat.RecentGoals,
-                "RecentAssists": PlayerStat.RecentAssists,
-                "RecentPoints": PlayerStat.RecentPoints,
-                "TeamRecentPoints": PlayerStat.TeamRecentPoints,
-                "NextFixtureDifficulty": PlayerStat.NextFixtureDifficulty,
-                "CaptainScore": 0 
-                }
-            else:
-                PlayerCaptainStats = {
-                "PlayerID": PlayerStat.PlayerID,
-                "RecentGoals": PlayerStat.RecentGoals,
-                "RecentAssists": PlayerStat.RecentAssists,
-                "RecentPoints": PlayerStat.RecentPoints,
-                "TeamRecentPoints": PlayerStat.TeamRecentPoints,
-                "NextFixtureDifficulty": 999,
-                "CaptainScore": 0 
-                }
-            PlayerScores.append(PlayerCaptainStats)
-
-        def RankPlayersCaptain(Players, StatName):
-            SortedPlayers = sorted(Players, key=lambda x: x[StatName], reverse=True)
-            for Index, Player in enumerate(SortedPlayers):
-                Player["CaptainScore"] += Index + 1  
-        def RankPlayersForTransfers(Players, StatName):
-            SortedPlayers = sorted(Players, key=lambda x: x[StatName], reverse=True)
-            for Index, Player in enumerate(SortedPlayers):
-                Player["SuggestionScore"] += Index + 1
-        
-        RankPlayersCaptain(PlayerScores, "RecentPoints")
-        RankPlayersCaptain(PlayerScores, "RecentGoals")
-        RankPlayersCaptain(PlayerScores, "RecentAssists")
-        RankPlayersCaptain(PlayerScores, "TeamRecentPoints")
+        # Captaincy only considers available players with up to date stats
+        UserTeamStats = GetTeamStats(PlayerIDs, SquadStats, CurrentGameweek)
+        PlayerScores = ScoreCaptains(UserTeamStats)
         if PlayerScores:
             WorstRecentPlayer = min(PlayerScores, key=lambda x: x["RecentPoints"])
         else:
@@ -441,40 +599,27 @@ def DisplayTeam():
         WorstRecentPlayerPoints = WorstRecentPlayer["RecentPoints"]
         BestRecentPlayer = max(PlayerScores, key=lambda x: x["RecentPoints"])
         BestRecentPlayerPoints = BestRecentPlayer["RecentPoints"]
-        Player = Players.query.filter_by(PlayerID=WorstRecentPlayer['PlayerID']).first()
+        Player = SquadPlayers.get(WorstRecentPlayer['PlayerID'])
         if Player:
             WorstRecentPlayer = Player.Name
-        Player = Players.query.filter_by(PlayerID=BestRecentPlayer['PlayerID']).first()
+        Player = SquadPlayers.get(BestRecentPlayer['PlayerID'])
         if Player:
             BestRecentPlayer = Player.Name
 
-        for Player in PlayerScores:
-            Player["CaptainScore"] += Player["NextFixtureDifficulty"]
-
-            if PlayerScores:
-                BestCaptain = min(PlayerScores, key=lambda x: x["CaptainScore"])
-            else:
-                BestCaptain = None
-
-            
-        PlayerStat = Players.query.filter_by(PlayerID=BestCaptain['PlayerID']).first()
+        BestCaptain, BestViceCaptain = PickCaptains(PlayerScores)
+        PlayerStat = SquadPlayers.get(BestCaptain['PlayerID'])
         if PlayerStat:
             BestCaptainName = PlayerStat.Name
         
-        RemainingPlayers = [Player for Player in PlayerScores if Player["PlayerID"] != BestCaptain['PlayerID']]
-        if RemainingPlayers:
-            BestViceCaptain = min(RemainingPlayers, key=lambda x: x["CaptainScore"])
-        PlayerStat = Players.query.filter_by(PlayerID=BestViceCaptain['PlayerID']).first()
+        PlayerStat = SquadPlayers.get(BestViceCaptain['PlayerID'])
         if PlayerStat:
             BestViceCaptainName = PlayerStat.Name
-        UserTeamStats = UserTeamStats = db.session.query(PlayerStats).filter(PlayerStats.PlayerID.in_(PlayerIDs), PlayerStats.CurrentGameweek == CurrentGameweek).all()
-        SortedPlayersByPoints = sorted(UserTeamStats, key=lambda x: x.RecentPoints, reverse=True)
         PlayerPositions = {}
         for PlayerID in PlayerIDs:
-            Player = Players.query.filter_by(PlayerID=PlayerID).first()
+            Player = SquadPlayers.get(PlayerID)
             if Player:
                 PlayerPositions[PlayerID] = Player.Position
-                PlayerStat = PlayerStats.query.filter_by(PlayerID=PlayerID).first()
+                PlayerStat = SquadStats.get(PlayerID)
                 if PlayerStat:
                     if Player.Position == 1 or Player.Position == 2:
                         if PlayerStat.RecentPoints < 9:
@@ -487,52 +632,23 @@ def DisplayTeam():
         if PoorPerformingPlayers > 3:
             UseWildcardOrFreeHit = True
         for PlayerID in PoorPerformingPlayersIDs:
-            Player = Players.query.filter_by(PlayerID=PlayerID).first()
+            Player = SquadPlayers.get(PlayerID)
             if Player:
                 PoorPerformingPlayersNames.append(Player.Name)
-        Goalkeepers = 0
-        Defenders = 0
-        Forwards = 0
-        RecommendedStartingPlayers = []
-        MinGoalkeepers = 1
-        MinDefenders = 3
-        MinForwards = 1
-        for PlayerStat in SortedPlayersByPoints:
-            if len(RecommendedStartingPlayers) < 11:
-                PlayerPosition = PlayerPositions.get(PlayerStat.PlayerID)  # Get the position from Player table
-            
-            if PlayerPosition == 1 and Goalkeepers < MinGoalkeepers:
-                RecommendedStartingPlayers.append(PlayerStat.PlayerID)
-                Goalkeepers += 1
-            elif PlayerPosition == 2 and Defenders < MinDefenders:
-                RecommendedStartingPlayers.append(PlayerStat.PlayerID)
-                Defenders += 1
-            elif PlayerPosition == 4 and Forwards < MinForwards:
-                RecommendedStartingPlayers.append(PlayerStat.PlayerID)
-                Forwards += 1
-            elif PlayerPosition == 3:
-                RecommendedStartingPlayers.append(PlayerStat.PlayerID)
-
-        if len(RecommendedStartingPlayers) < 11:
-            UserTeamStats = [PlayerStat for PlayerStat in SortedPlayersByPoints if PlayerStat.PlayerID not in RecommendedStartingPlayers]
-            SortedPlayersByPoints = sorted(UserTeamStats, key=lambda x: x.RecentPoints, reverse=True)
-            while len(RecommendedStartingPlayers) < 11:
-                NextPlayer = SortedPlayersByPoints.pop(0)
-                PlayerPosition = PlayerPositions.get(NextPlayer.PlayerID)
-                if PlayerPosition != 1:
-                    RecommendedStartingPlayers.append(NextPlayer.PlayerID)
+        # The recommended XI is picked from the whole up to date squad, injured and suspended players included
+        RecommendedStartingPlayers = RecommendStartingXI(GetSquadStats(PlayerIDs, SquadStats, CurrentGameweek), PlayerPositions)
 
         PlayersToSwap = []
         for Player in range(len(RecommendedStartingPlayers)):
             if RecommendedStartingPlayers[Player] not in StartingPlayerIDs:
                 PlayersToSwap.append(RecommendedStartingPlayers[Player])
         
-        PlayersToSwapNames = [Player.Name for Player in Players.query.filter(Players.PlayerID.in_(PlayersToSwap)).all()]
+        PlayersToSwapNames = [SquadPlayers[PlayerID].Name for PlayerID in sorted(set(PlayersToSwap)) if PlayerID in SquadPlayers]
         PlayersToRemove = []
         for Player in range(len(RecommendedStartingPlayers)):
             if StartingPlayerIDs[Player] not in RecommendedStartingPlayers:
                 PlayersToRemove.append(StartingPlayerIDs[Player])
-        PlayersToRemoveNames = [Player.Name for Player in Players.query.filter(Players.PlayerID.in_(PlayersToRemove)).all()]
+        PlayersToRemoveNames = [SquadPlayers[PlayerID].Name for PlayerID in sorted(set(PlayersToRemove)) if PlayerID in SquadPlayers]
 
         #Specific player feedback 
         if request.method == 'POST':
@@ -540,297 +656,42 @@ def DisplayTeam():
             PlayerOut = request.form.get('UnwantedPlayer')
             Budget = request.form.get('Budget')
             PlayerOutID = scraper.GetPlayerID(PlayerOut)
-            PlayerRemove = Players.query.filter_by(PlayerID=PlayerOutID).first()
+            if PlayerOutID not in SquadPlayers:
+                # The unwanted player may not be in the squad, so load just them the same way
+                OutPlayers, OutTeams, OutStats = LoadSquad([PlayerOutID])
+                SquadPlayers.update(OutPlayers)
+                SquadTeams.update(OutTeams)
+                SquadStats.update(OutStats)
+            PlayerRemove = SquadPlayers.get(PlayerOutID)
 
             if PlayerRemove:
                 PlayerRemovePosition = PlayerRemove.Position
 
-            PlayerRemoveStats = PlayerStats.query.filter_by(PlayerID=PlayerOutID).first()
+            PlayerRemoveStats = SquadStats.get(PlayerOutID)
             if PlayerRemoveStats:
-                PlayerRemovePoints = PlayerRemoveStats.RecentPoints
-                PlayerRemoveGoals = PlayerRemoveStats.RecentGoals
-                PlayerRemoveAssists = PlayerRemoveStats.RecentAssists
-
-                SamePositionPlayers = [Player.PlayerID for Player in Players.query.filter_by(Position=PlayerRemovePosition).all() if Player.PlayerID != PlayerOutID]
-                UnavailablePlayers = []
-                PlayersToRemove = []
-
-                for PlayerID in SamePositionPlayers:
-                    if PlayerID in PlayerIDs:
-                        # Ensures none of the players already in the user's team is recommended to them
-                        PlayersToRemove.append(PlayerID)
-                    PlayerStat = PlayerStats.query.filter_by(PlayerID=PlayerID).first()
-                    if PlayerStat:
-                        # Injured and suspended players are filtered out
-                        if PlayerStat.Injured:
-                            UnavailablePlayers.append(PlayerID)
-                        elif PlayerStat.Suspended:
-                            UnavailablePlayers.append(PlayerID)
-
-                for PlayerID in UnavailablePlayers:
-                    if PlayerID in SamePositionPlayers:
-                        PlayersToRemove.append(PlayerID)
-
-                for PlayerID in PlayersToRemove:
-                    if PlayerID in SamePositionPlayers:
-                        SamePositionPlayers.remove(PlayerID)
-                
-                #Reset PlayersToRemove  
-                PlayersToRemove = []
                 RemainingTeam = [PlayerID for PlayerID in PlayerIDs if PlayerID != PlayerOutID]
                 RealTeamCount = {}
                 # Check if user has hit the limit of having players from a certain team
                 for PlayerID in RemainingTeam:
-                    Player = Players.query.filter_by(PlayerID=PlayerID).first()
+                    Player = SquadPlayers.get(PlayerID)
                     if Player:
-                        RealTeam = RealTeams.query.filter_by(TeamID=Player.TeamID).first()
+                        RealTeam = SquadTeams.get(PlayerID)
                         if RealTeam:
                             if RealTeam in RealTeamCount:
                                 RealTeamCount[RealTeam] += 1
                             else:
                                 RealTeamCount[RealTeam] = 1
+                FullTeamIDs = [Team.TeamID for Team in RealTeamCount if RealTeamCount[Team] >= 3]
 
-                for PlayerID in SamePositionPlayers:
-                    SamePositionPlayer = Players.query.filter_by(PlayerID=PlayerID).first()
-                    for Team in RealTeamCount:
-                        if RealTeamCount.get(Team) == 3:
-                            if SamePositionPlayer:
-                                if SamePositionPlayer.TeamID == Team.TeamID:
-                                    PlayersToRemove.append(PlayerID)
-                    # Finding the most suitable player starts here, the algorithm is tailored to the position of the player 
-                    # 4 - Forward, 3 - Midfielder, 2 - Defender, 1 - Goalkeeper
-                    if SamePositionPlayer:
-                        if SamePositionPlayer.Price > float(Budget):
-                            PlayersToRemove.append(PlayerID)
-                        if PlayerRemovePosition == 4:
-                            PlayerStat = PlayerStats.query.filter_by(PlayerID=PlayerID).first()
-                            if PlayerStat:
-                                if PlayerStat.RecentPoints < PlayerRemovePoints:
-                                    if PlayerID not in PlayersToRemove:
-                                        PlayersToRemove.append(PlayerID)
-                                elif PlayerStat.RecentGoals < PlayerRemoveGoals:
-                                    if PlayerID not in PlayersToRemove:
-                                        PlayersToRemove.append(PlayerID)
-                        if PlayerRemovePosition == 3:
-                            PlayerStat = PlayerStats.query.filter_by(PlayerID=PlayerID).first()
-                            if PlayerStat:
-                                if PlayerStat.RecentPoints < PlayerRemovePoints:
-                                    if PlayerID not in PlayersToRemove:
-                                        PlayersToRemove.append(PlayerID)
-                                elif PlayerStat.RecentAssists < PlayerRemoveAssists:
-                                    if PlayerID not in PlayersToRemove:
-                                        PlayersToRemove.append(PlayerID)
-                                        
-                        if PlayerRemovePosition == 2:
-                            PlayerStat = PlayerStats.query.filter_by(PlayerID=PlayerID).first()
-                            if PlayerStat:
-                                if PlayerStat.RecentPoints < PlayerRemovePoints:
-                                    if PlayerID not in PlayersToRemove:
-                                        PlayersToRemove.append(PlayerID)
-                                        
-                                elif PlayerStat.CleanSheets < PlayerRemoveStats.CleanSheets:
-                                    if PlayerID not in PlayersToRemove:
-                                        PlayersToRemove.append(PlayerID)
-                                        
-                        if PlayerRemovePosition == 1:
-                            PlayerStat = PlayerStats.query.filter_by(PlayerID=PlayerID).first()
-                            if PlayerStat:
-                                if PlayerStat.RecentPoints < PlayerRemovePoints:
-                                    if PlayerID not in PlayersToRemove:
-                                        PlayersToRemove.append(PlayerID)
-
-                for PlayerID in PlayersToRemove:
-                    if PlayerID in SamePositionPlayers:
-                        SamePositionPlayers.remove(PlayerID)
-                PlayerSuggestionScores = []
-                SamePositionPlayersStats = [PlayerStat for PlayerStat in PlayerStats.query.filter(PlayerStats.PlayerID.in_(SamePositionPlayers)).all()]
-                
-                if PlayerRemovePosition == 4:
-                    for PlayerStat in SamePositionPlayersStats:
-                        if PlayerStat.NextFixtureDifficulty != None:
-                            PlayerSuggestionStats = {
-                                "PlayerID": PlayerStat.PlayerID,
-                                "xG": PlayerStat.xG,
-                                "xA": PlayerStat.xA,
-                                "RecentGoals": PlayerStat.RecentGoals,
-                                "RecentAssists": PlayerStat.RecentAssists,
-                                "RecentPoints": PlayerStat.RecentPoints,
-                                "TeamRecentPoints": PlayerStat.TeamRecentPoints,
-                                "NextFixtureDifficulty": PlayerStat.NextFixtureDifficulty,
-                                "SuggestionScore": 0 
-                                }
-                        else:
-                            PlayerSuggestionStats = {
-                                "PlayerID": PlayerStat.PlayerID,
-                                "xG": PlayerStat.xG,
-                                "xA": PlayerStat.xA,
-                                "RecentGoals": PlayerStat.RecentGoals,
-                                "RecentAssists": PlayerStat.RecentAssists,
-                                "RecentPoints": PlayerStat.RecentPoints,
-                                "TeamRecentPoints": PlayerStat.TeamRecentPoints,
-                                "NextFixtureDifficulty": 0,
-                                "SuggestionScore": 0 
-                                }
-                        PlayerSuggestionScores.append(PlayerSuggestionStats)
-                    RankPlayersForTransfers(PlayerSuggestionScores, "RecentPoints")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "xG")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "xA")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "RecentGoals")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "RecentAssists")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "TeamRecentPoints")
-                    
-                    for Player in PlayerSuggestionScores:
-                        Player["SuggestionScore"] += Player["NextFixtureDifficulty"]
-                elif PlayerRemovePosition == 3:
-                    for PlayerStat in SamePositionPlayersStats:
-                        if PlayerStat.NextFixtureDifficulty != None:
-                            PlayerSuggestionStats = {
-                                "PlayerID": PlayerStat.PlayerID,
-                                "xG": PlayerStat.xG,
-                                "xA": PlayerStat.xA,
-                                "RecentGoals": PlayerStat.RecentGoals,
-                                "RecentAssists": PlayerStat.RecentAssists,
-                                "RecentPoints": PlayerStat.RecentPoints,
-                                "TeamRecentPoints": PlayerStat.TeamRecentPoints,
-                                "NextFixtureDifficulty": PlayerStat.NextFixtureDifficulty,
-                                "SuggestionScore": 0 
-                                }
-                        else:
-                            PlayerSuggestionStats = {
-                                "PlayerID": PlayerStat.PlayerID,
-                                "xG": PlayerStat.xG,
-                                "xA": PlayerStat.xA,
-                                "RecentGoals": PlayerStat.RecentGoals,
-                                "RecentAssists": PlayerStat.RecentAssists,
-                                "RecentPoints": PlayerStat.RecentPoints,
-                                "TeamRecentPoints": PlayerStat.TeamRecentPoints,
-                                "NextFixtureDifficulty": 0,
-                                "SuggestionScore": 0 
-                                }
-                        
-                        PlayerSuggestionScores.append(PlayerSuggestionStats)
-                    RankPlayersForTransfers(PlayerSuggestionScores, "RecentPoints")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "xG")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "xA")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "RecentGoals")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "RecentAssists")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "TeamRecentPoints")
-                    
-                    for Player in PlayerSuggestionScores:
-                        Player["SuggestionScore"] += Player["NextFixtureDifficulty"]
-
-                elif PlayerRemovePosition == 2:
-                    for PlayerStat in SamePositionPlayersStats:
-                        if PlayerStat.NextFixtureDifficulty != None:
-                            PlayerSuggestionStats = {
-                                "PlayerID": PlayerStat.PlayerID,
-                                "xG": PlayerStat.xG,
-                                "xA": PlayerStat.xA,
-                                "RecentGoals": PlayerStat.RecentGoals,
-                                "RecentAssists": PlayerStat.RecentAssists,
-                                "RecentPoints": PlayerStat.RecentPoints,
-                                "TeamRecentPoints": PlayerStat.TeamRecentPoints,
-                                "NextFixtureDifficulty": PlayerStat.NextFixtureDifficulty,
-                                "CleanSheets": PlayerStat.CleanSheets,
-                                "SuggestionScore": 0 
-                                }
-                        else:
-                            PlayerSuggestionStats = {
-                                "PlayerID": PlayerStat.PlayerID,
-                                "xG": PlayerStat.xG,
-                                "xA": PlayerStat.xA,
-                                "RecentGoals": PlayerStat.RecentGoals,
-                                "RecentAssists": PlayerStat.RecentAssists,
-                                "RecentPoints": PlayerStat.RecentPoints,
-                                "TeamRecentPoints": PlayerStat.TeamRecentPoints,
-                                "NextFixtureDifficulty": 0,
-                                "CleanSheets": PlayerStat.CleanSheets,
-                                "SuggestionScore": 0 
-                                }
-
-                        PlayerSuggestionScores.append(PlayerSuggestionStats)
-                    RankPlayersForTransfers(PlayerSuggestionScores, "RecentPoints")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "xG")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "xA")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "CleanSheets")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "RecentGoals")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "RecentAssists")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "TeamRecentPoints")
-                    
-                    for Player in PlayerSuggestionScores:
-                        Player["SuggestionScore"] += Player["NextFixtureDifficulty"]
-                elif PlayerRemovePosition == 1:
-                    def GetGoalkeeperMinutes(PlayerID):
-                        url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-                        response = requests.get(url)
-                        data = response.json()
-                        Elements = data['elements']
-
-                        Player = next((Player for Player in Elements if Player['id'] == PlayerID), None)
-                        return Player["minutes"] if Player else None
-                    
-                    def GetGoalkeeperGoalsConceded(PlayerID):
-                        url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-                        response = requests.get(url)
-                        data = response.json()
-                        Elements = data['elements']
-
-                        Player = next((Player for Player in Elements if Player['id'] == PlayerID), None)
-                        return Player["goals_conceded"] if Player else None
-                        
-
-                    for PlayerStat in SamePositionPlayersStats:
-                        if PlayerStat.NextFixtureDifficulty != None:
-                            PlayerSuggestionStats = {
-                                "PlayerID": PlayerStat.PlayerID,
-                                "RecentPoints": PlayerStat.RecentPoints,
-                                "TeamRecentPoints": PlayerStat.TeamRecentPoints,
-                                "NextFixtureDifficulty": PlayerStat.NextFixtureDifficulty,
-                                "Saves": PlayerStat.Saves,
-                                "PenaltySaves": PlayerStat.PenaltySaves,
-                                "YellowCards": PlayerStat.YellowCards,
-                                "RedCards": PlayerStat.RedCards,
-                                "MinutesPlayed": GetGoalkeeperMinutes(PlayerStat.PlayerID),
-                                "GoalsConceded": GetGoalkeeperGoalsConceded(PlayerStat.PlayerID),
-                                "SuggestionScore": 0 
-                                }
-                        else:
-                            PlayerSuggestionStats = {
-                                "PlayerID": PlayerStat.PlayerID,
-                                "RecentPoints": PlayerStat.RecentPoints,
-                                "TeamRecentPoints": PlayerStat.TeamRecentPoints,
-                                "NextFixtureDifficulty": 0,
-                                "Saves": PlayerStat.Saves,
-                                "PenaltySaves": PlayerStat.PenaltySaves,
-                                "YellowCards": PlayerStat.YellowCards,
-                                "RedCards": PlayerStat.RedCards,
-                                "MinutesPlayed": GetGoalkeeperMinutes(PlayerStat.PlayerID),
-                                "GoalsConceded": GetGoalkeeperGoalsConceded(PlayerStat.PlayerID),
-                                "SuggestionScore": 0 
-                                }
-                        PlayerSuggestionScores.append(PlayerSuggestionStats)
-                    
-                    def RankPlayersByCards(Players, CardType):
-                        SortedPlayers = sorted(Players, key=lambda x: x[CardType], reverse=False)
-                        for Index, Player in enumerate(SortedPlayers):
-                            Player["SuggestionScore"] += Index + 1
-
-                    RankPlayersForTransfers(PlayerSuggestionScores, "RecentPoints")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "Saves")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "PenaltySaves")
-                    RankPlayersByCards(PlayerSuggestionScores, "YellowCards")
-                    RankPlayersByCards(PlayerSuggestionScores, "RedCards")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "MinutesPlayed")
-                    RankPlayersForTransfers(PlayerSuggestionScores, "GoalsConceded")
-                    for Player in PlayerSuggestionScores:
-                        Player["SuggestionScore"] += Player["NextFixtureDifficulty"]
-                if len(PlayerSuggestionScores) == 0:
+                # Players already in the team are never recommended
+                # Injured, suspended, unaffordable and weaker players than the one leaving are filtered out
+                TransferSuggestions = QueryTransferSuggestions(PlayerRemovePosition, PlayerRemoveStats, Budget,
+                                                               ExcludedIDs=set(PlayerIDs) | {PlayerOutID}, FullTeamIDs=FullTeamIDs)
+                if len(TransferSuggestions) == 0:
                     BestTransfer = "No one"
                 else:
-                    BestTransfer = min(PlayerSuggestionScores, key=lambda x: x["SuggestionScore"])    
-                    PlayerStat = Players.query.filter_by(PlayerID=BestTransfer['PlayerID']).first()
-                    if PlayerStat:
-                        BestTransfer = PlayerStat.Name    
+                    BestTransfer = TransferSuggestions[0][1]
+                    TransferAlternatives = [Name for PlayerID, Name, Score in TransferSuggestions[1:]]
         # Assistant manager chip advice 
         EasiestFixtureTeam = scraper.GetEasiestFixtureTeam(RealTeams, CurrentGameweek)
         EasiestFixtureTeamManager = scraper.GetTeamManager(EasiestFixtureTeam)
@@ -853,6 +714,7 @@ def DisplayTeam():
                                PlayersToSwap = PlayersToSwapNames, 
                                PlayersToRemove = PlayersToRemoveNames, 
                                BestTransfer = BestTransfer, 
+                               TransferAlternatives = TransferAlternatives, 
                                PlayerOut = PlayerOut, 
                                Budget = Budget, 
                                UnwantedPlayer = PlayerOut, 
@@ -869,7 +731,14 @@ def DisplayTeam():
     except Exception as e:
         return render_template("error.html", ErrorMessage=f"An error occurred: {str(e)}")
 
+@app.route("/team/<int:TeamID>/live")
+@login_required
+def LiveTeamPoints(TeamID):
+    # Server-sent events with the squad's live score and provisional bonus, pushed whenever the score changes
+    return Response(livefeed.Stream(TeamID), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/playerstats', methods=['GET'])
+@pagecache.Cached('Players', 'PlayerStats')
 def PlayerStatsPage():
     # Team badges and colours for display
     TeamMapping = {
@@ -922,55 +791,12 @@ def PlayerStatsPage():
     
     #Last season
     if Season == "Last":
-        # Finding the top 25 players in each stats and then making the design for the top player, same algorithm for this season's stats
-        LastSeasonGoalLeaders = db.session.query(Players.Name, PlayerStats.LastSeasonGoals)\
-            .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
-            .filter(Players.PlayerID != 764)\
-            .order_by(PlayerStats.LastSeasonGoals.desc()).limit(25).all()
-
-        GoalLeader = Players.query.filter_by(Name=LastSeasonGoalLeaders[0][0]).first()
-        if GoalLeader:
-            GoalLeaderBadge = TeamMapping.get(GoalLeader.TeamID)
-            GoalLeaderBadge = GoalLeaderBadge["Badge"]
-            GoalLeaderColor = TeamColors.get(GoalLeader.TeamID)
-            GoalLeaderColor = GoalLeaderColor["Color"]
-
-        LastSeasonAssistLeaders = db.session.query(Players.Name, PlayerStats.LastSeasonAssists)\
-            .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
-            .filter(Players.PlayerID != 764)\
-            .order_by(PlayerStats.LastSeasonAssists.desc()).limit(25).all()
-
-        AssistLeader = Players.query.filter_by(Name=LastSeasonAssistLeaders[0][0]).first()
-        if AssistLeader:
-            AssistLeaderBadge = TeamMapping.get(AssistLeader.TeamID)
-            AssistLeaderBadge = AssistLeaderBadge["Badge"]
-            AssistLeaderColor = TeamColors.get(AssistLeader.TeamID)
-            AssistLeaderColor = AssistLeaderColor["Color"]
-
-        LastSeasonPointsLeaders = db.session.query(Players.Name, PlayerStats.LastSeasonPoints)\
-            .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
-            .filter(Players.PlayerID != 764)\
-            .order_by(PlayerStats.LastSeasonPoints.desc()).limit(25).all()
-
-        PointsLeader = Players.query.filter_by(Name=LastSeasonPointsLeaders[0][0]).first()
-        if PointsLeader:
-            PointsLeaderBadge = TeamMapping.get(PointsLeader.TeamID)
-            PointsLeaderBadge = PointsLeaderBadge["Badge"]
-            PointsLeaderColor = TeamColors.get(PointsLeader.TeamID)
-            PointsLeaderColor = PointsLeaderColor["Color"]
-
-        LastSeasonCleanSheetsLeaders = db.session.query(Players.Name, PlayerStats.LastSeasonCleanSheets)\
-            .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
-            .filter(Players.Position==1)\
-            .filter(Players.PlayerID != 764)\
-            .order_by(PlayerStats.LastSeasonCleanSheets.desc()).limit(25).all()
-
-        CleanSheetsLeader = Players.query.filter_by(Name=LastSeasonCleanSheetsLeaders[0][0]).first()
-        if CleanSheetsLeader:
-            CleanSheetsLeaderBadge = TeamMapping.get(CleanSheetsLeader.TeamID)
-            CleanSheetsLeaderBadge = CleanSheetsLeaderBadge["Badge"]
-            CleanSheetsLeaderColor = TeamColors.get(CleanSheetsLeader.TeamID)
-            CleanSheetsLeaderColor = CleanSheetsLeaderColor["Color"]
+        # The top 25 players in each stat and the team of the top player, same for this season's stats
+        Leaderboards = LoadLeaderboards(LastSeasonLeaderboards, ExcludedIDs=(764,))
+        LastSeasonGoalLeaders, GoalLeaderTeam = Leaderboards["Goals"]
+        LastSeasonAssistLeaders, AssistLeaderTeam = Leaderboards["Assists"]
+        LastSeasonPointsLeaders, PointsLeaderTeam = Leaderboards["Points"]
+        LastSeasonCleanSheetsLeaders, CleanSheetsLeaderTeam = Leaderboards["CleanSheets"]
 
         return render_template('playerstats.html', 
                                 LastSeasonGoalLeaders=LastSeasonGoalLeaders,
@@ -978,77 +804,24 @@ def PlayerStatsPage():
                                 LastSeasonPointsLeaders=LastSeasonPointsLeaders,
                                 LastSeasonCleanSheetsLeaders=LastSeasonCleanSheetsLeaders,
                                 Season=Season,
-                                GoalLeaderBadge=GoalLeaderBadge,
-                                AssistLeaderBadge=AssistLeaderBadge,
-                                PointsLeaderBadge=PointsLeaderBadge,
-                                CleanSheetsLeaderBadge=CleanSheetsLeaderBadge,
-                                GoalLeaderColor=GoalLeaderColor,
-                                AssistLeaderColor=AssistLeaderColor,
-                                PointsLeaderColor=PointsLeaderColor,
-                                CleanSheetsLeaderColor=CleanSheetsLeaderColor)
+                                GoalLeaderBadge=TeamMapping[GoalLeaderTeam]["Badge"],
+                                AssistLeaderBadge=TeamMapping[AssistLeaderTeam]["Badge"],
+                                PointsLeaderBadge=TeamMapping[PointsLeaderTeam]["Badge"],
+                                CleanSheetsLeaderBadge=TeamMapping[CleanSheetsLeaderTeam]["Badge"],
+                                GoalLeaderColor=TeamColors[GoalLeaderTeam]["Color"],
+                                AssistLeaderColor=TeamColors[AssistLeaderTeam]["Color"],
+                                PointsLeaderColor=TeamColors[PointsLeaderTeam]["Color"],
+                                CleanSheetsLeaderColor=TeamColors[CleanSheetsLeaderTeam]["Color"])
 
     #This season's stats 
     else:
-        GoalsLeaders = db.session.query(Players.Name, PlayerStats.Goals)\
-            .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
-            .order_by(PlayerStats.Goals.desc()).limit(25).all()
-        GoalLeader = Players.query.filter_by(Name=GoalsLeaders[0][0]).first()
-        if GoalLeader:
-            GoalLeaderBadge = TeamMapping.get(GoalLeader.TeamID)
-            GoalLeaderBadge = GoalLeaderBadge["Badge"]
-            GoalLeaderColor = TeamColors.get(GoalLeader.TeamID)
-            GoalLeaderColor = GoalLeaderColor["Color"]
-
-        AssistsLeaders = db.session.query(Players.Name, PlayerStats.Assists)\
-            .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
-            .order_by(PlayerStats.Assists.desc()).limit(25).all()
-        AssistLeader = Players.query.filter_by(Name=AssistsLeaders[0][0]).first()
-        if AssistLeader:
-            AssistLeaderBadge = TeamMapping.get(AssistLeader.TeamID)
-            AssistLeaderBadge = AssistLeaderBadge["Badge"]
-            AssistLeaderColor = TeamColors.get(AssistLeader.TeamID)
-            AssistLeaderColor = AssistLeaderColor["Color"]
-
-        PointsLeaders = db.session.query(Players.Name, PlayerStats.Points)\
-            .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
-            .order_by(PlayerStats.Points.desc()).limit(25).all()
-        PointsLeader = Players.query.filter_by(Name=PointsLeaders[0][0]).first()
-        if PointsLeader:
-            PointsLeaderBadge = TeamMapping.get(PointsLeader.TeamID)
-            PointsLeaderBadge = PointsLeaderBadge["Badge"]
-            PointsLeaderColor = TeamColors.get(PointsLeader.TeamID)
-            PointsLeaderColor = PointsLeaderColor["Color"]
-
-        xGLeaders = db.session.query(Players.Name, PlayerStats.xG)\
-            .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
-            .order_by(PlayerStats.xG.desc()).limit(25).all()
-        xGLeader = Players.query.filter_by(Name=xGLeaders[0][0]).first()
-        if xGLeader:
-            xGLeaderBadge = TeamMapping.get(xGLeader.TeamID)
-            xGLeaderBadge = xGLeaderBadge["Badge"]
-            xGLeaderColor = TeamColors.get(xGLeader.TeamID)
-            xGLeaderColor = xGLeaderColor["Color"]
-
-        xALeaders = db.session.query(Players.Name, PlayerStats.xA)\
-            .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
-            .order_by(PlayerStats.xA.desc()).limit(25).all()
-        xALeader = Players.query.filter_by(Name=xALeaders[0][0]).first()
-        if xALeader:
-            xALeaderBadge = TeamMapping.get(xALeader.TeamID)
-            xALeaderBadge = xALeaderBadge["Badge"]
-            xALeaderColor = TeamColors.get(xALeader.TeamID)
-            xALeaderColor = xALeaderColor["Color"]
-        
-        CleanSheetsLeaders = db.session.query(Players.Name, PlayerStats.CleanSheets)\
-            .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
-            .filter(Players.Position==1)\
-            .order_by(PlayerStats.CleanSheets.desc()).limit(25).all()
-        CleanSheetsLeader = Players.query.filter_by(Name=CleanSheetsLeaders[0][0]).first()
-        if CleanSheetsLeader:
-            CleanSheetsLeaderBadge = TeamMapping.get(CleanSheetsLeader.TeamID)
-            CleanSheetsLeaderBadge = CleanSheetsLeaderBadge["Badge"]
-            CleanSheetsLeaderColor = TeamColors.get(CleanSheetsLeader.TeamID)
-            CleanSheetsLeaderColor = CleanSheetsLeaderColor["Color"]
+        Leaderboards = LoadLeaderboards(ThisSeasonLeaderboards)
+        GoalsLeaders, GoalLeaderTeam = Leaderboards["Goals"]
+        AssistsLeaders, AssistLeaderTeam = Leaderboards["Assists"]
+        PointsLeaders, PointsLeaderTeam = Leaderboards["Points"]
+        xGLeaders, xGLeaderTeam = Leaderboards["xG"]
+        xALeaders, xALeaderTeam = Leaderboards["xA"]
+        CleanSheetsLeaders, CleanSheetsLeaderTeam = Leaderboards["CleanSheets"]
 
         return render_template('playerstats.html', 
                                GoalsLeaders=GoalsLeaders,
@@ -1058,21 +831,23 @@ def PlayerStatsPage():
                                 xALeaders=xALeaders, 
                                 CleanSheetsLeaders=CleanSheetsLeaders,
                                 Season=Season,
-                                GoalLeaderBadge=GoalLeaderBadge,
-                                AssistLeaderBadge=AssistLeaderBadge,
-                                PointsLeaderBadge=PointsLeaderBadge,
-                                xGLeaderBadge=xGLeaderBadge,
-                                xALeaderBadge=xALeaderBadge,
-                                CleanSheetsLeaderBadge=CleanSheetsLeaderBadge,
-                                GoalLeaderColor=GoalLeaderColor,
-                                AssistLeaderColor=AssistLeaderColor,
-                                PointsLeaderColor=PointsLeaderColor,
-                                xGLeaderColor=xGLeaderColor,
-                                xALeaderColor=xALeaderColor,
-                                CleanSheetsLeaderColor=CleanSheetsLeaderColor)
+                                GoalLeaderBadge=TeamMapping[GoalLeaderTeam]["Badge"],
+                                AssistLeaderBadge=TeamMapping[AssistLeaderTeam]["Badge"],
+                                PointsLeaderBadge=TeamMapping[PointsLeaderTeam]["Badge"],
+                                xGLeaderBadge=TeamMapping[xGLeaderTeam]["Badge"],
+                                xALeaderBadge=TeamMapping[xALeaderTeam]["Badge"],
+                                CleanSheetsLeaderBadge=TeamMapping[CleanSheetsLeaderTeam]["Badge"],
+                                GoalLeaderColor=TeamColors[GoalLeaderTeam]["Color"],
+                                AssistLeaderColor=TeamColors[AssistLeaderTeam]["Color"],
+                                PointsLeaderColor=TeamColors[PointsLeaderTeam]["Color"],
+                                xGLeaderColor=TeamColors[xGLeaderTeam]["Color"],
+                                xALeaderColor=TeamColors[xALeaderTeam]["Color"],
+                                CleanSheetsLeaderColor=TeamColors[CleanSheetsLeaderTeam]["Color"])
 
     
 @app.route("/fixtures", methods=['GET'])
+# The split between upcoming and old fixtures moves at each deadline, whether or not the fixtures have been refreshed yet
+@pagecache.Cached('Fixtures', Extra=lambda: scraper.GetCurrentGameweek())
 def ShowFixtures():
     #Seperating out fixtures that haven't been played yet to be displayed on the top and the old fixtures below them
     UpcomingFixtures = defaultdict(list)
@@ -1126,6 +901,141 @@ def ShowFixtures():
 
     return render_template("fixtures.html", UpcomingFixtures=UpcomingFixtures, OldFixtures=OldFixtures)
 
+@app.route("/transfers")
+@login_required
+def PlanTeamTransfers():
+    # Best 1, 2 and 3 transfer combinations for the user's squad, scored on recent points less any hits
+    TeamID = request.args.get("teamID")
+    if not TeamID:
+        User = Users.query.filter_by(Username=session.get("Username")).first()
+        if User and User.FPLTeamID:
+            TeamID = User.FPLTeamID
+        else:
+            return render_template("error.html", ErrorMessage="Error: No team ID saved to your account.")
+    try:
+        FreeTransfers = min(max(int(request.args.get("FreeTransfers", 1)), 0), 5)
+    except ValueError:
+        return render_template("error.html", ErrorMessage="Error: Invalid number of free transfers. Please try again.")
+
+    try:
+        TeamData = scraper.GetTeamPicks(TeamID, scraper.GetCurrentGameweek())
+    except Exception as e:
+        return render_template("error.html", ErrorMessage=f"Error fetching team data: {e}")
+    PlayerIDs = [pick["element"] for pick in TeamData.get("picks", [])]
+    # The bank is reported in tenths of a million
+    Bank = (TeamData.get("entry_history") or {}).get("bank", 0) / 10
+
+    SquadPlayers, SquadTeams, SquadStats = LoadSquad(PlayerIDs)
+    Squad = [{
+        "PlayerID": PlayerID,
+        "Name": SquadPlayers[PlayerID].Name,
+        "Position": SquadPlayers[PlayerID].Position,
+        "TeamID": SquadPlayers[PlayerID].TeamID,
+        "Price": SquadPlayers[PlayerID].Price,
+        "Projection": SquadStats[PlayerID].RecentPoints if PlayerID in SquadStats else 0,
+    } for PlayerID in PlayerIDs if PlayerID in SquadPlayers]
+    # Picks not in Players yet, such as a player added since the last refresh, can't be planned for and are listed instead
+    Missing = [(scraper.GetBootstrapSnapshot().GetPlayer(PlayerID) or {}).get("web_name", str(PlayerID)) for PlayerID in PlayerIDs if PlayerID not in SquadPlayers]
+
+    # 4 - Forward, 3 - Midfielder, 2 - Defender, 1 - Goalkeeper
+    Candidates = GetCandidateLists({Position: LoadPositionColumns(Position) for Position in (1, 2, 3, 4)}, ExcludedIDs=set(PlayerIDs))
+    Plans = PlanTransfers(Squad, Candidates, Bank, FreeTransfers=FreeTransfers)
+    BestPlan = max(Plans, key=lambda Plan: Plan["NetGain"]) if Plans else None
+    if BestPlan and BestPlan["NetGain"] <= 0:
+        BestPlan = None
+    return render_template("transferplan.html",
+                           Plans=Plans,
+                           BestPlan=BestPlan,
+                           Bank=Bank,
+                           FreeTransfers=FreeTransfers,
+                           Missing=Missing,
+                           TeamID=TeamID)
+
+@app.route("/league")
+@app.route("/league/<int:LeagueID>")
+@login_required
+def LeagueAnalysis(LeagueID=None):
+    # Captaincy, effective ownership, differentials and chip advice for every entry in a classic league
+    LeagueID = LeagueID or request.args.get("leagueID")
+    try:
+        LeagueID = int(LeagueID)
+    except (TypeError, ValueError):
+        return render_template("error.html", ErrorMessage="Error: Invalid league ID. Please try again.")
+
+    try:
+        CurrentGameweek = scraper.GetCurrentGameweek()
+        League, Standings, PicksByEntry, HistoriesByEntry, Truncated = FetchLeague(scraper, LeagueID, CurrentGameweek)
+        StatsByID, PlayerPositions, Names = LoadPlayerData()
+        Analysis = AnalyseLeague(scraper.GetBootstrapSnapshot(), Standings, PicksByEntry, HistoriesByEntry,
+                                 StatsByID, PlayerPositions, CurrentGameweek, scraper.GetNextDoubleGameweek())
+    except Exception as e:
+        return render_template("error.html", ErrorMessage=f"Error fetching league data: {e}")
+
+    return render_template("league.html",
+                           League=League,
+                           Entries=Analysis["Entries"],
+                           Players=Analysis["Players"],
+                           Size=Analysis["Size"],
+                           Missing=len(Standings) - Analysis["Size"],
+                           Truncated=Truncated,
+                           CurrentGameweek=CurrentGameweek)
+
+# PlayerStats columns the squad optimizer can treat as each player's projected score
+ProjectionColumns = {
+    "RecentPoints": "Recent points",
+    "Points": "Total points",
+    "ICTIndex": "ICT index",
+    "Bps": "Bonus points system",
+    "xG": "Expected goals",
+    "xA": "Expected assists",
+}
+
+@app.route("/optimizer")
+@login_required
+def SquadOptimizer():
+    # Best 15-man squad and starting XI for the chosen projection, injured and suspended players are left out
+    Projection = request.args.get("Projection", "RecentPoints")
+    if Projection not in ProjectionColumns:
+        Projection = "RecentPoints"
+    try:
+        Budget = float(request.args.get("Budget", 100.0))
+    except ValueError:
+        return render_template("error.html", ErrorMessage="Error: Invalid budget. Please try again.")
+
+    Pool = db.session.query(Players.PlayerID, Players.Name, Players.Position, Players.TeamID, Players.Price, RealTeams.Name, getattr(PlayerStats, Projection))\
+        .join(PlayerStats, Players.PlayerID == PlayerStats.PlayerID)\
+        .join(RealTeams, Players.TeamID == RealTeams.TeamID)\
+        .filter(PlayerStats.Injured == False, PlayerStats.Suspended == False).all()
+    Result = OptimizeSquad([Row[0] for Row in Pool], [Row[2] for Row in Pool], [Row[3] for Row in Pool],
+                           [Row[4] for Row in Pool], [Row[6] or 0 for Row in Pool], Budget=Budget) if Pool else None
+    if Result is None:
+        return render_template("error.html", ErrorMessage="Error: No squad fits that budget. Please try again.")
+
+    PoolByID = {Row[0]: {"Name": Row[1], "Position": Row[2], "Price": Row[4], "Team": Row[5], "Projection": Row[6]} for Row in Pool}
+    Starting = [PoolByID[PlayerID] for PlayerID in Result["Starting"]]
+    # 4 - Forward, 3 - Midfielder, 2 - Defender, 1 - Goalkeeper
+    Sections = [
+        ("Goalkeeper", [Player for Player in Starting if Player["Position"] == 1]),
+        ("Defenders", [Player for Player in Starting if Player["Position"] == 2]),
+        ("Midfielders", [Player for Player in Starting if Player["Position"] == 3]),
+        ("Forwards", [Player for Player in Starting if Player["Position"] == 4]),
+        ("Bench", sorted([PoolByID[PlayerID] for PlayerID in Result["Bench"]], key=lambda x: x["Position"])),
+    ]
+    return render_template("optimizer.html",
+                           Sections=Sections,
+                           Captain=PoolByID[Result["Captain"]]["Name"],
+                           Cost=Result["Cost"],
+                           ProjectedPoints=Result["ProjectedPoints"],
+                           Optimal=Result["Optimal"],
+                           Projection=Projection,
+                           ProjectionColumns=ProjectionColumns,
+                           Budget=Budget)
+
+@app.route('/metrics')
+def Metrics():
+    # Aggregated request, upstream, SQL and render histograms in the Prometheus text format
+    return Response(metrics.Render(), mimetype='text/plain; version=0.0.4')
+
 @app.route("/<name>")
 def hello(name):
     return f"Hello, {escape(name)}!"
@@ -1,32 +1,99 @@
+import argparse
+import os
 import time
+from sqlalchemy.dialects.sqlite import insert
 from scraper import Scraper
-from app import app, db, PlayerStats, Players, RealTeams, Fixtures
+from app import app, db, PlayerStats, Players, RealTeams, Fixtures, PlayerFingerprints, PlayerRankings, DataVersions, SchedulerState, LoadPositionColumns, FPLCacheDir, FPLSchedulerLock, FPLCassette, FPLCassetteMode
+from transfers import GetRankingRows
 
 scraper = Scraper()
 
 class AutoScraper(Scraper):
-    def __init__(self, app_context, db_session):
-        #Inheriting from Scraper class
-        super().__init__()  
+    def __init__(self, app_context, db_session, Concurrency=8, BatchSize=200):
+        #Inheriting from Scraper class, with a connection pool big enough for every fetch worker
+        super().__init__(PoolSize=max(10, Concurrency), CacheDir=FPLCacheDir, CassettePath=FPLCassette, CassetteMode=FPLCassetteMode)  
         self.app_context = app_context  
         self.db_session = db_session  
+        # Number of element-summary downloads allowed in flight at once
+        self.Concurrency = Concurrency
+        # Rows written per upsert statement and transaction
+        self.BatchSize = BatchSize
+
+    def BulkUpsert(self, Model, Rows, Commit=True):
+        # Write rows with INSERT ... ON CONFLICT DO UPDATE as one executemany and one transaction per batch
+        # Commit=False leaves every batch in the caller's open transaction instead
+        Rows = list(Rows)
+        if not Rows:
+            return 0
+        Keys = [Column.name for Column in Model.__table__.primary_key.columns]
+        for Start in range(0, len(Rows), self.BatchSize):
+            Batch = Rows[Start:Start + self.BatchSize]
+            Statement = insert(Model.__table__)
+            Statement = Statement.on_conflict_do_update(
+                index_elements=Keys,
+                set_={Name: Statement.excluded[Name] for Name in Batch[0] if Name not in Keys}
+            )
+            db.session.execute(Statement, Batch)
+            if Commit:
+                db.session.commit()
+        return len(Rows)
+
+    def BumpDataVersion(self, Name):
+        # Tell the web app's page cache that a table has new data, in the same transaction as the change itself
+        Statement = insert(DataVersions.__table__).values(Name=Name, Version=1)
+        db.session.execute(Statement.on_conflict_do_update(index_elements=['Name'], set_={'Version': DataVersions.__table__.c.Version + 1}))
+
+    def GetLastFullRefreshGameweek(self):
+        # The gameweek the scheduler last refreshed in full, kept in the database so a restart doesn't repeat it
+        with app.app_context():
+            State = db.session.get(SchedulerState, 'LastFullRefreshGameweek')
+            return State.Value if State else None
+
+    def SetLastFullRefreshGameweek(self, Gameweek):
+        with app.app_context():
+            db.session.merge(SchedulerState(Name='LastFullRefreshGameweek', Value=Gameweek))
+            db.session.commit()
+
+    def GetChangedRows(self, Model, Rows):
+        # The rows that are new or differ from what is stored, compared on the columns each row carries
+        Keys = [Column.name for Column in Model.__table__.primary_key.columns]
+        # The API sends some numbers as strings, so new values are read as the column's type before comparing
+        Types = {Column.name: Column.type.python_type for Column in Model.__table__.columns}
+        IsSame = lambda Name, Value, StoredValue: StoredValue == (Types[Name](Value) if Value is not None and StoredValue is not None else Value)
+        Stored = {tuple(Row[Key] for Key in Keys): Row for Row in db.session.execute(db.select(Model.__table__)).mappings()}
+        Changed = []
+        for Row in Rows:
+            StoredRow = Stored.get(tuple(Row[Key] for Key in Keys))
+            if StoredRow is None or not all(IsSame(Name, Value, StoredRow[Name]) for Name, Value in Row.items()):
+                Changed.append(Row)
+        return Changed
+
+    def ReplaceTable(self, Model, Rows):
+        # Swap a table's contents for Rows in one transaction, so pages never see it empty or half-loaded
+        # Nothing is written, and cached pages are kept, when the table already holds exactly these rows
+        Rows = list(Rows)
+        if len(Rows) == db.session.query(Model).count() and not self.GetChangedRows(Model, Rows):
+            db.session.rollback()
+            return False
+        db.session.query(Model).delete()
+        self.BulkUpsert(Model, Rows, Commit=False)
+        self.BumpDataVersion(Model.__tablename__)
+        db.session.commit()
+        return True
 
     def UpdateRealTeams(self):
         #Populating the RealTeams table with the latest season data
         with app.app_context():
             try:
                 Teams = self.GetRealTeams()  
-                for TeamID, TeamName in Teams.items():
-                    ExistingTeam = RealTeams.query.filter_by(TeamID=TeamID).first()
-                    if ExistingTeam:
-                        db.session.delete(ExistingTeam)
-
-                    NewTeam = RealTeams(TeamID=TeamID, Name=TeamName)
-                    db.session.add(NewTeam)
-
+                Changed = self.GetChangedRows(RealTeams, [{'TeamID': TeamID, 'Name': TeamName} for TeamID, TeamName in Teams.items()])
+                if Changed:
+                    self.BulkUpsert(RealTeams, Changed, Commit=False)
+                    self.BumpDataVersion('RealTeams')
                 db.session.commit()
                 print("Real teams updated successfully")
             except Exception as e:
+                db.session.rollback()
                 print(f"Error updating real teams: {e}")
 
     def UpdateFixtures(self):
@@ -34,139 +101,151 @@ class AutoScraper(Scraper):
         with app.app_context():
             try:
                 FixtureData = self.GetFixtures()  
-                Fixtures.query.delete()
-                db.session.commit()
 
+                Rows = []
                 for Fixture in FixtureData:
-                    HomeTeam = Fixture['team_h']
-                    AwayTeam = Fixture['team_a']
-                    Gameweek = Fixture['event']
-
                     # Access the scores directly; set to -1 if they're missing
                     HomeScore = Fixture['team_h_score'] if Fixture.get('team_h_score') is not None else -1
                     AwayScore = Fixture['team_a_score'] if Fixture.get('team_a_score') is not None else -1
 
-                    # Check if the fixture already exists in the database
-                    ExistingFixture = Fixtures.query.filter_by(HomeTeam=HomeTeam, AwayTeam=AwayTeam, Gameweek=Gameweek).first()
-
-                    # If fixture doesn't exist, add it to the database
-                    if not ExistingFixture:
-                        NewFixture = Fixtures(
-                            HomeTeam = HomeTeam,
-                            AwayTeam = AwayTeam,
-                            Gameweek = Gameweek,
-                            HomeScore = HomeScore,
-                            AwayScore = AwayScore
-                        )
-                        db.session.add(NewFixture)
-
-                db.session.commit()
-                print("Fixtures wiped and updated!")
+                    Rows.append({
+                        'HomeTeam': Fixture['team_h'],
+                        'AwayTeam': Fixture['team_a'],
+                        'Gameweek': Fixture['event'],
+                        'HomeScore': HomeScore,
+                        'AwayScore': AwayScore
+                    })
+
+                if self.ReplaceTable(Fixtures, Rows):
+                    print("Fixtures wiped and updated!")
+                else:
+                    print("Fixtures unchanged")
             except Exception as e:
+                db.session.rollback()
                 print(f"Error updating fixtures: {e}")
 
     def UpdatePlayers(self):
         #Populating the Players table with the latest season data from FPL API
         with app.app_context():
             try:
-                db.session.query(Players).delete()  
                 PlayersData = self.GetGeneralPlayerData()
 
-                for Player in PlayersData:
-                    NewPlayer = Players(
-                        PlayerID=Player['ID'],
-                        TeamID=Player['Team'],
-                        Name=Player['Name'],
-                        Position=Player['Position'],
-                        Price=Player['Price']
-                    )
-                    db.session.add(NewPlayer)
-
-                db.session.commit()
-                print("Players updated!")
+                Changed = self.ReplaceTable(Players, [{
+                    'PlayerID': Player['ID'],
+                    'TeamID': Player['Team'],
+                    'Name': Player['Name'],
+                    'Position': Player['Position'],
+                    'Price': Player['Price']
+                } for Player in PlayersData])
+                print("Players updated!" if Changed else "Players unchanged")
 
             except Exception as e:
+                db.session.rollback()
                 print(f"Error updating players: {e}")
 
-    def UpdatePlayerStats(self):
+    def GetChangedPlayerIDs(self, PlayerIDs, Fingerprints):
+        # Players whose bootstrap fingerprint differs from the one persisted with their last stats write
+        StoredFingerprints = {Row.PlayerID: Row.Fingerprint for Row in PlayerFingerprints.query.all()}
+        PlayersWithStats = {PlayerID for (PlayerID,) in db.session.query(PlayerStats.PlayerID).all()}
+        return [
+            PlayerID for PlayerID in PlayerIDs
+            if Fingerprints.get(PlayerID) is None
+            or StoredFingerprints.get(PlayerID) != Fingerprints[PlayerID]
+            or PlayerID not in PlayersWithStats
+        ]
+
+    def WritePlayerStats(self, PendingStats, Fingerprints):
+        # Persist a batch of stats and the fingerprints they were computed from as one transaction
+        # Only rows that differ from the stored ones are written, and only they invalidate cached pages
+        Changed = self.GetChangedRows(PlayerStats, PendingStats)
+        self.BulkUpsert(PlayerStats, Changed, Commit=False)
+        self.BulkUpsert(PlayerFingerprints, [
+            {'PlayerID': PlayerStat['PlayerID'], 'Fingerprint': Fingerprints[PlayerStat['PlayerID']]}
+            for PlayerStat in PendingStats if Fingerprints.get(PlayerStat['PlayerID'])
+        ], Commit=False)
+        if Changed:
+            self.BumpDataVersion('PlayerStats')
+        db.session.commit()
+        return len(Changed)
+
+    def UpdatePlayerStats(self, Incremental=False):
         #Populating the PlayerStats table with the latest gameweek data from FPL API
         with app.app_context():
             try:
+                # Start the run from a bootstrap-static snapshot checked with the server, then share it across every player
+                self.InvalidateBootstrap(Revalidate=True)
+                self.InvalidateFixtures(Revalidate=True)
+                Snapshot = self.GetBootstrapSnapshot()
+                FixtureIndex = self.GetFixtureIndex()
                 PlayerStack = [Player.PlayerID for Player in Players.query.all()]
+                Fingerprints = {PlayerID: Snapshot.GetFingerprint(PlayerID, FixtureIndex) for PlayerID in PlayerStack}
+                if Incremental:
+                    # Only players whose minutes, points, status, price or team fixtures moved since the last run are refetched
+                    PlayerStack = self.GetChangedPlayerIDs(PlayerStack, Fingerprints)
+                    print(f"{len(PlayerStack)} players changed since the last refresh")
                 print(PlayerStack)
-                while len(PlayerStack) > 0:
-                    PlayerID = PlayerStack.pop()
-                    PlayerStat = self.GetPlayerStats(PlayerID)
-                    
+                PendingStats = []
+                Written = 0
+                # Worker threads download concurrently while this thread is the single writer to the database
+                for PlayerID, PlayerStat, Error in self.FetchPlayerStats(PlayerStack, self.Concurrency):
+                    if Error:
+                        print(f"Error fetching PlayerID {PlayerID}: {Error}")
+                        continue
+
                     if not PlayerStat:
                         print(f"No data for PlayerID {PlayerID}")
                         continue
 
-                    ExistingPlayerStat = PlayerStats.query.filter_by(PlayerID=PlayerStat['PlayerID']).first()
-                    
-                    if ExistingPlayerStat:
-                        # Update the existing player stats
-                        print("Existing player found")
-                        ExistingPlayerStat.CurrentGameweek = PlayerStat['CurrentGameweek']
-                        ExistingPlayerStat.TeamRecentPoints = PlayerStat['TeamRecentPoints']
-                        ExistingPlayerStat.NextFixtureDifficulty = PlayerStat['NextFixtureDifficulty']
-                        ExistingPlayerStat.Goals = PlayerStat['Goals']
-                        ExistingPlayerStat.Assists = PlayerStat['Assists']
-                        ExistingPlayerStat.Points = PlayerStat['Points']
-                        ExistingPlayerStat.xG = PlayerStat['xG']
-                        ExistingPlayerStat.xA = PlayerStat['xA']
-                        ExistingPlayerStat.RecentGoals = PlayerStat['RecentGoals']
-                        ExistingPlayerStat.RecentAssists = PlayerStat['RecentAssists']
-                        ExistingPlayerStat.RecentPoints = PlayerStat['RecentPoints']
-                        ExistingPlayerStat.CleanSheets = PlayerStat['CleanSheets']
-                        ExistingPlayerStat.Saves = PlayerStat['Saves']
-                        ExistingPlayerStat.PenaltySaves = PlayerStat['PenaltySaves']
-                        ExistingPlayerStat.YellowCards = PlayerStat['YellowCards']
-                        ExistingPlayerStat.RedCards = PlayerStat['RedCards']
-                        ExistingPlayerStat.Injured = PlayerStat['Injured']
-                        ExistingPlayerStat.Suspended = PlayerStat['Suspended']
-                        ExistingPlayerStat.LastSeasonPoints = PlayerStat['LastSeasonPoints']
-                        ExistingPlayerStat.LastSeasonGoals = PlayerStat['LastSeasonGoals']
-                        ExistingPlayerStat.LastSeasonAssists = PlayerStat['LastSeasonAssists']
-                        ExistingPlayerStat.LastSeasonCleanSheets = PlayerStat['LastSeasonCleanSheets']
-                        print("Player updated")
-                    else:
-                        # Insert new player stats
-                        print("New player being added")
-                        NewPlayerStat = PlayerStats(
-                            PlayerID = PlayerStat['PlayerID'],
-                            CurrentGameweek = PlayerStat['CurrentGameweek'],
-                            TeamRecentPoints = PlayerStat['TeamRecentPoints'],
-                            NextFixtureDifficulty = PlayerStat['NextFixtureDifficulty'],
-                            Goals = PlayerStat['Goals'],
-                            Assists = PlayerStat['Assists'],
-                            Points = PlayerStat['Points'],
-                            xG = PlayerStat['xG'],
-                            xA = PlayerStat['xA'],
-                            RecentGoals = PlayerStat['RecentGoals'],
-                            RecentAssists = PlayerStat['RecentAssists'],
-                            RecentPoints = PlayerStat['RecentPoints'],
-                            CleanSheets = PlayerStat['CleanSheets'],
-                            Saves = PlayerStat['Saves'],
-                            PenaltySaves = PlayerStat['PenaltySaves'],
-                            YellowCards = PlayerStat['YellowCards'],
-                            RedCards = PlayerStat['RedCards'],
-                            Injured = PlayerStat['Injured'],
-                            Suspended = PlayerStat['Suspended'],
-                            LastSeasonPoints = PlayerStat['LastSeasonPoints'],
-                            LastSeasonGoals = PlayerStat['LastSeasonGoals'],
-                            LastSeasonAssists = PlayerStat['LastSeasonAssists'],
-                            LastSeasonCleanSheets = PlayerStat['LastSeasonCleanSheets'],
-                        )
-                        db.session.add(NewPlayerStat)
-                        print("Player added")
-                    
-                    db.session.commit()
-                
-                print(f"Player stats updated successfully")
+                    PendingStats.append(PlayerStat)
+                    if len(PendingStats) >= self.BatchSize:
+                        Written += self.WritePlayerStats(PendingStats, Fingerprints)
+                        PendingStats = []
+
+                Written += self.WritePlayerStats(PendingStats, Fingerprints)
+                print(f"Player stats updated successfully, {Written} changed")
             except Exception as e:
+                db.session.rollback()
                 print(f"Error updating player stats: {e}")
 
+    def UpdateRankings(self):
+        #Populating the PlayerRankings table from the stats just written, so transfer suggestions are an indexed lookup
+        with app.app_context():
+            try:
+                Rows = []
+                # 4 - Forward, 3 - Midfielder, 2 - Defender, 1 - Goalkeeper
+                for Position in (1, 2, 3, 4):
+                    Columns = LoadPositionColumns(Position)
+                    if len(Columns):
+                        Rows.extend(GetRankingRows(Columns))
+                if self.ReplaceTable(PlayerRankings, Rows):
+                    print("Player rankings updated!")
+                else:
+                    print("Player rankings unchanged")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error updating player rankings: {e}")
+
+    def RunAll(self, Incremental=False):
+        #Every stage in dependency order, teams and fixtures before players, players before their stats and rankings
+        self.UpdateRealTeams()
+        self.UpdateFixtures()
+        self.UpdatePlayers()
+        self.UpdatePlayerStats(Incremental=Incremental)
+        self.UpdateRankings()
+
 if __name__ == "__main__":
-    AutoScraper = AutoScraper(app.app_context(), db.session)
-    AutoScraper.UpdatePlayerStats()
\ No newline at end of file
+    Parser = argparse.ArgumentParser(description="Refresh the FPL Helper database from the FPL API")
+    Parser.add_argument("--incremental", action="store_true", help="only refresh players whose bootstrap data changed since the last run")
+    Parser.add_argument("--all", action="store_true", help="also refresh teams, fixtures and players before the stats")
+    Parser.add_argument("--schedule", action="store_true", help="keep refreshing on the deadline and kickoff aware schedule until interrupted")
+    Arguments = Parser.parse_args()
+
+    AutoScraper = AutoScraper(app.app_context(), db.session, Concurrency=int(os.getenv("FPL_SCRAPER_CONCURRENCY", 8)))
+    if Arguments.schedule:
+        from scheduler import RunScheduler
+        RunScheduler(AutoScraper, FPLSchedulerLock)
+    elif Arguments.all:
+        AutoScraper.RunAll(Incremental=Arguments.incremental)
+    else:
+        AutoScraper.UpdatePlayerStats(Incremental=Arguments.incremental)
+        AutoScraper.UpdateRankings()
\ No newline at end of file
@@ -0,0 +1,197 @@
+#End-to-end refresh benchmark for the AutoScraper stages, run against generated or replayed FPL data
+#python benchmark.py                                    - generated data served by an in-process fakefpl stand-in
+#python benchmark.py --cassette fpl.json.gz             - replay a cassette recorded with FPL_CASSETTE_MODE=record
+#Results are written as JSON so runs can be compared across releases
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+def StartStandIn(Arguments):
+    # Serve generated data from a background thread on a free local port
+    from werkzeug.serving import make_server
+    from fakefpl import CreateApp, GeneratedData
+    Data = GeneratedData(Arguments.seed, Arguments.current_gameweek, Arguments.players_per_team)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    Server = make_server("127.0.0.1", 0, CreateApp(Data, Arguments.latency_ms), threaded=True)
+    threading.Thread(target=Server.serve_forever, daemon=True).start()
+    return Server
+
+def GetRevision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class StatementCounter():
+    def __init__(self, Engine):
+        # Counts every statement SQLAlchemy sends to the database, an executemany counts once
+        from sqlalchemy import event
+        self.Engine = Engine
+        self.Count = 0
+        event.listen(Engine, "before_cursor_execute", self.OnExecute)
+
+    def OnExecute(self, Connection, Cursor, Statement, Parameters, Context, ExecuteMany):
+        self.Count += 1
+
+    def Close(self):
+        from sqlalchemy import event
+        event.remove(self.Engine, "before_cursor_execute", self.OnExecute)
+
+def MeasureStage(Name, Function, Scraper, Engine):
+    Counter = StatementCounter(Engine)
+    Before = dict(Scraper.Counters)
+    tracemalloc.start()
+    Start = time.perf_counter()
+    try:
+        Function()
+    finally:
+        WallTime = time.perf_counter() - Start
+        _, PeakMemory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        Counter.Close()
+
+    return {
+        "Stage": Name,
+        "WallTimeSeconds": round(WallTime, 4),
+        "UpstreamRequests": Scraper.Counters["Requests"] - Before["Requests"],
+        "UpstreamBytes": Scraper.Counters["Bytes"] - Before["Bytes"],
+        "CacheHits": Scraper.Counters["CacheHits"] - Before["CacheHits"],
+        "ReplayedResponses": Scraper.Counters["Replayed"] - Before["Replayed"],
+        "SQLStatements": Counter.Count,
+        "PeakMemoryBytes": PeakMemory,
+    }
+
+def ReadLeaderboards(Ready, Finished, Results):
+    # Runs in its own process, like a web worker, reading the stats page leaderboards until told to stop
+    from app import app, db, LoadLeaderboards, ThisSeasonLeaderboards
+    Latencies = []
+    Errors = []
+    with app.app_context():
+        Ready.set()
+        while not Finished.is_set():
+            Start = time.perf_counter()
+            try:
+                LoadLeaderboards(ThisSeasonLeaderboards)
+                Latencies.append(time.perf_counter() - Start)
+            except Exception as e:
+                Errors.append(str(e))
+            finally:
+                # A fresh session for every read, as each request gets
+                db.session.remove()
+    Results.put((Latencies, Errors))
+
+def MeasureReadsDuringRefresh(Refresh):
+    # Read latency seen by another process while a refresh writes, the database settings decide whether readers wait
+    Context = multiprocessing.get_context("spawn")
+    Ready, Finished, Results = Context.Event(), Context.Event(), Context.Queue()
+    Reader = Context.Process(target=ReadLeaderboards, args=(Ready, Finished, Results))
+    Reader.start()
+    Ready.wait()
+    Start = time.perf_counter()
+    try:
+        Refresh()
+    finally:
+        WallTime = time.perf_counter() - Start
+        Finished.set()
+        Latencies, Errors = Results.get()
+        Reader.join()
+
+    Latencies.sort()
+    Percentile = lambda Fraction: round(Latencies[min(len(Latencies) - 1, int(Fraction * len(Latencies)))] * 1000, 3) if Latencies else None
+    return {
+        "RefreshSeconds": round(WallTime, 4),
+        "Reads": len(Latencies),
+        "ReadErrors": len(Errors),
+        "FirstError": Errors[0] if Errors else None,
+        "ReadP50Milliseconds": Percentile(0.5),
+        "ReadP95Milliseconds": Percentile(0.95),
+        "ReadMaxMilliseconds": round(Latencies[-1] * 1000, 3) if Latencies else None,
+    }
+
+def Run(Arguments):
+    WorkDir = tempfile.mkdtemp(prefix="fplhelper-benchmark-")
+    # The benchmark never touches the real database or the shared response cache
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WorkDir, 'benchmark.db')}"
+    os.environ["FPL_CACHE_DIR"] = os.path.join(WorkDir, "fplcache")
+    Server = None
+    if Arguments.cassette:
+        os.environ["FPL_CASSETTE"] = os.path.abspath(Arguments.cassette)
+        os.environ["FPL_CASSETTE_MODE"] = "replay"
+        Source = f"cassette:{Arguments.cassette}"
+    else:
+        Server = StartStandIn(Arguments)
+        os.environ["FPL_API_BASE"] = f"http://127.0.0.1:{Server.server_port}/api/"
+        Source = f"generated:seed={Arguments.seed},latency_ms={Arguments.latency_ms}"
+
+    # Imported only now so app.py picks up the database and upstream settings above
+    from app import app, db
+    from autoscraper import AutoScraper
+    from scraper import ResponseCache
+
+    Refresher = AutoScraper(app.app_context(), db.session, Concurrency=Arguments.concurrency)
+    with app.app_context():
+        Engine = db.engine
+    Stages = [
+        ("UpdateRealTeams", Refresher.UpdateRealTeams),
+        ("UpdateFixtures", Refresher.UpdateFixtures),
+        ("UpdatePlayers", Refresher.UpdatePlayers),
+        ("UpdatePlayerStats", Refresher.UpdatePlayerStats),
+        ("UpdatePlayerStats (incremental)", lambda: Refresher.UpdatePlayerStats(Incremental=True)),
+        ("UpdateRankings", Refresher.UpdateRankings),
+    ]
+    Results = [MeasureStage(Name, Function, Refresher, Engine) for Name, Function in Stages]
+    # The stats page leaderboards read over and over while every player's stats are rewritten
+    # The refresher starts from an empty response cache so the refresh takes as long as a real one
+    ColdRefresher = AutoScraper(app.app_context(), db.session, Concurrency=Arguments.concurrency)
+    ColdRefresher.Cache = ResponseCache(os.path.join(WorkDir, "coldcache"))
+    ReadsDuringRefresh = MeasureReadsDuringRefresh(ColdRefresher.UpdatePlayerStats)
+
+    if Server:
+        Server.shutdown()
+
+    return {
+        "Timestamp": datetime.now(timezone.utc).isoformat(),
+        "Revision": GetRevision(),
+        "Python": platform.python_version(),
+        "Platform": platform.platform(),
+        "Source": Source,
+        "Concurrency": Arguments.concurrency,
+        "Stages": Results,
+        "ReadsDuringRefresh": ReadsDuringRefresh,
+        "Total": {
+            Key: round(sum(Result[Key] for Result in Results), 4)
+            for Key in ("WallTimeSeconds", "UpstreamRequests", "UpstreamBytes", "SQLStatements")
+        },
+    }
+
+if __name__ == "__main__":
+    Parser = argparse.ArgumentParser(description="Benchmark the AutoScraper refresh stages")
+    Parser.add_argument("--cassette", help="replay this cassette instead of serving generated data")
+    Parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    Parser.add_argument("--concurrency", type=int, default=8)
+    Parser.add_argument("--seed", type=int, default=0)
+    Parser.add_argument("--current-gameweek", type=int, default=10)
+    Parser.add_argument("--players-per-team", type=int, default=30)
+    Parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every generated response")
+    Arguments = Parser.parse_args()
+
+    Report = Run(Arguments)
+    with open(Arguments.output, "w", encoding="utf-8") as File:
+        json.dump(Report, File, indent=2)
+
+    print(f"{'Stage':34} {'Seconds':>9} {'Requests':>9} {'Bytes':>12} {'SQL':>7} {'Peak MB':>8}")
+    for Result in Report["Stages"]:
+        print(f"{Result['Stage']:34} {Result['WallTimeSeconds']:9.3f} {Result['UpstreamRequests']:9} {Result['UpstreamBytes']:12} {Result['SQLStatements']:7} {Result['PeakMemoryBytes'] / 1e6:8.1f}")
+    Reads = Report["ReadsDuringRefresh"]
+    print(f"Reads during a {Reads['RefreshSeconds']:.3f}s stats refresh: {Reads['Reads']} reads, {Reads['ReadErrors']} errors, "
+          f"p50 {Reads['ReadP50Milliseconds']} ms, p95 {Reads['ReadP95Milliseconds']} ms, max {Reads['ReadMaxMilliseconds']} ms")
+    print(f"Results saved to {Arguments.output}")
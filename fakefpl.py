@@ -0,0 +1,337 @@
+#Local stand-in for fantasy.premierleague.com/api used for load testing the app and the AutoScraper
+#Run it, then point the app at it with FPL_API_BASE=http://127.0.0.1:8001/api/
+import argparse
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from flask import Flask, Response, abort, request
+from scraper import GetCassette
+
+TeamNames = [
+    ("Arsenal", "ARS"), ("Aston Villa", "AVL"), ("Bournemouth", "BOU"), ("Brentford", "BRE"),
+    ("Brighton", "BHA"), ("Chelsea", "CHE"), ("Crystal Palace", "CRY"), ("Everton", "EVE"),
+    ("Fulham", "FUL"), ("Ipswich", "IPS"), ("Leicester", "LEI"), ("Liverpool", "LIV"),
+    ("Man City", "MCI"), ("Man Utd", "MUN"), ("Newcastle", "NEW"), ("Nott'm Forest", "NFO"),
+    ("Southampton", "SOU"), ("Spurs", "TOT"), ("West Ham", "WHU"), ("Wolves", "WOL"),
+]
+
+# Squad quotas per position: 1 - Goalkeeper, 2 - Defender, 3 - Midfielder, 4 - Forward
+SquadQuotas = {1: 2, 2: 5, 3: 5, 4: 3}
+
+def FormatTime(Moment):
+    return Moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class GeneratedData():
+    def __init__(self, Seed=0, CurrentGameweek=10, PlayersPerTeam=30):
+        # A full synthetic season, shaped like the real API responses the Scraper reads
+        self.Seed = Seed
+        self.CurrentGameweek = CurrentGameweek
+        Random = random.Random(Seed)
+        Now = datetime.now(timezone.utc).replace(microsecond=0)
+        # The current gameweek's deadline was two days ago, every other one is a week apart
+        CurrentDeadline = Now - timedelta(days=2)
+
+        self.Events = []
+        for Gameweek in range(1, 39):
+            Deadline = CurrentDeadline + timedelta(weeks=Gameweek - CurrentGameweek)
+            self.Events.append({
+                "id": Gameweek,
+                "name": f"Gameweek {Gameweek}",
+                "deadline_time": FormatTime(Deadline),
+                "is_previous": Gameweek == CurrentGameweek - 1,
+                "is_current": Gameweek == CurrentGameweek,
+                "is_next": Gameweek == CurrentGameweek + 1,
+                "finished": Gameweek < CurrentGameweek,
+                "data_checked": Gameweek < CurrentGameweek,
+            })
+
+        self.Teams = [
+            {"id": TeamID, "name": Name, "short_name": ShortName, "strength": Random.randint(2, 5)}
+            for TeamID, (Name, ShortName) in enumerate(TeamNames, start=1)
+        ]
+
+        # Double round robin using the circle method, home and away swapped in the second half of the season
+        self.Fixtures = []
+        Rotation = list(range(1, 21))
+        Rounds = []
+        for Round in range(19):
+            Rounds.append([(Rotation[i], Rotation[19 - i]) if Round % 2 == 0 else (Rotation[19 - i], Rotation[i]) for i in range(10)])
+            Rotation = [Rotation[0]] + [Rotation[-1]] + Rotation[1:-1]
+        Rounds += [[(Away, Home) for Home, Away in Round] for Round in Rounds]
+        Strength = {Team["id"]: Team["strength"] for Team in self.Teams}
+        for Gameweek, Round in enumerate(Rounds, start=1):
+            Kickoff = ParseTime(self.Events[Gameweek - 1]["deadline_time"]) + timedelta(hours=1, minutes=30)
+            for Home, Away in Round:
+                Finished = Gameweek < CurrentGameweek
+                self.Fixtures.append({
+                    "id": len(self.Fixtures) + 1,
+                    "code": 2444470 + len(self.Fixtures),
+                    "event": Gameweek,
+                    "kickoff_time": FormatTime(Kickoff),
+                    "team_h": Home,
+                    "team_a": Away,
+                    "team_h_difficulty": Strength[Away],
+                    "team_a_difficulty": Strength[Home],
+                    "team_h_score": Random.randint(0, 4) if Finished else None,
+                    "team_a_score": Random.randint(0, 3) if Finished else None,
+                    "started": Gameweek <= CurrentGameweek,
+                    "finished": Finished,
+                    "finished_provisional": Finished,
+                })
+
+        self.Elements = []
+        self.Histories = {}
+        for Team in self.Teams:
+            for Index in range(PlayersPerTeam):
+                Position = 1 if Index < 3 else 2 if Index < 12 else 3 if Index < 23 else 4
+                PlayerID = len(self.Elements) + 1
+                History = self.MakeHistory(Random, PlayerID, Team["id"], Position)
+                self.Histories[PlayerID] = History
+                Minutes = sum(Gameweek["minutes"] for Gameweek in History)
+                self.Elements.append({
+                    "id": PlayerID,
+                    "code": 100000 + PlayerID,
+                    "web_name": f"{Team['short_name'].title()}{Index + 1}",
+                    "first_name": Team["name"],
+                    "second_name": f"Player {Index + 1}",
+                    "team": Team["id"],
+                    "element_type": Position,
+                    "status": Random.choices("aids", weights=[90, 5, 3, 2])[0],
+                    "now_cost": Random.randint(40, 70) + (25 if Position in (3, 4) and Index % 4 == 0 else 0),
+                    "minutes": Minutes,
+                    "starts": sum(1 for Gameweek in History if Gameweek["minutes"] >= 60),
+                    "total_points": sum(Gameweek["total_points"] for Gameweek in History),
+                    "event_points": History[-1]["total_points"] if History else 0,
+                    "goals_scored": sum(Gameweek["goals_scored"] for Gameweek in History),
+                    "assists": sum(Gameweek["assists"] for Gameweek in History),
+                    "clean_sheets": sum(Gameweek["clean_sheets"] for Gameweek in History),
+                    "goals_conceded": sum(Gameweek["goals_conceded"] for Gameweek in History),
+                    "saves": sum(Gameweek["saves"] for Gameweek in History),
+                    "penalties_saved": Random.randint(0, 1) if Position == 1 else 0,
+                    "yellow_cards": Random.randint(0, 4),
+                    "red_cards": Random.choices([0, 1], weights=[95, 5])[0],
+                    "bonus": sum(Gameweek["bonus"] for Gameweek in History),
+                    "bps": sum(Gameweek["bps"] for Gameweek in History),
+                    "ict_index": f"{Minutes / 60:.1f}",
+                    "expected_goals": f"{Random.random() * (6 if Position == 4 else 3):.2f}",
+                    "expected_assists": f"{Random.random() * 3:.2f}",
+                    "expected_goals_conceded": f"{Random.random() * 12:.2f}",
+                    "selected_by_percent": f"{Random.random() * 40:.1f}",
+                })
+
+    def MakeHistory(self, Random, PlayerID, TeamID, Position):
+        History = []
+        for Gameweek in range(1, self.CurrentGameweek):
+            Minutes = Random.choice([0, 0, 30, 60, 90, 90, 90])
+            Goals = Random.choices([0, 1, 2], weights=[85, 12, 3])[0] if Minutes and Position > 1 else 0
+            Assists = Random.choices([0, 1], weights=[88, 12])[0] if Minutes else 0
+            CleanSheet = 1 if Minutes >= 60 and Random.random() < 0.3 else 0
+            Bonus = Random.choice([0, 0, 0, 1, 2, 3]) if Minutes else 0
+            History.append({
+                "element": PlayerID,
+                "round": Gameweek,
+                "minutes": Minutes,
+                "goals_scored": Goals,
+                "assists": Assists,
+                "clean_sheets": CleanSheet,
+                "goals_conceded": 0 if CleanSheet or not Minutes else Random.randint(1, 3),
+                "saves": Random.randint(0, 6) if Position == 1 and Minutes else 0,
+                "bonus": Bonus,
+                "bps": Random.randint(0, 40) if Minutes else 0,
+                "total_points": (2 if Minutes >= 60 else 1 if Minutes else 0) + Goals * (4 if Position > 2 else 6) + Assists * 3 + CleanSheet * (4 if Position < 3 else 1) + Bonus,
+            })
+        return History
+
+    def BootstrapStatic(self):
+        return {
+            "events": self.Events,
+            "teams": self.Teams,
+            "elements": self.Elements,
+            "element_types": [
+                {"id": 1, "singular_name": "Goalkeeper", "squad_select": 2},
+                {"id": 2, "singular_name": "Defender", "squad_select": 5},
+                {"id": 3, "singular_name": "Midfielder", "squad_select": 5},
+                {"id": 4, "singular_name": "Forward", "squad_select": 3},
+            ],
+        }
+
+    def ElementSummary(self, PlayerID):
+        if PlayerID not in self.Histories:
+            return None
+        Random = random.Random(self.Seed * 1000003 + PlayerID)
+        return {
+            "fixtures": [],
+            "history": self.Histories[PlayerID],
+            "history_past": [{
+                "season_name": "2023/24",
+                "element_code": 100000 + PlayerID,
+                "total_points": Random.randint(0, 250),
+                "goals_scored": Random.randint(0, 25),
+                "assists": Random.randint(0, 15),
+                "clean_sheets": Random.randint(0, 15),
+            }],
+        }
+
+    def Entry(self, EntryID):
+        return {"id": EntryID, "name": f"Stand-in XI {EntryID}", "player_first_name": "Test", "player_last_name": f"Manager {EntryID}"}
+
+    def Picks(self, EntryID, Gameweek):
+        # A valid 15-man squad that is stable for the entry, 3 players per club at most
+        Random = random.Random(self.Seed * 1000003 + EntryID)
+        ClubCounts = {}
+        Squad = {Position: [] for Position in SquadQuotas}
+        for Player in Random.sample(self.Elements, len(self.Elements)):
+            Position = Player["element_type"]
+            if len(Squad[Position]) < SquadQuotas[Position] and ClubCounts.get(Player["team"], 0) < 3:
+                Squad[Position].append(Player["id"])
+                ClubCounts[Player["team"]] = ClubCounts.get(Player["team"], 0) + 1
+        # 4-4-2 starting XI followed by the bench with the reserve goalkeeper first
+        Order = Squad[1][:1] + Squad[2][:4] + Squad[3][:4] + Squad[4][:2] + Squad[1][1:] + Squad[2][4:] + Squad[3][4:] + Squad[4][2:]
+        Captain = Random.randint(1, 11)
+        ViceCaptain = Captain % 11 + 1
+        return {
+            "active_chip": None,
+            "automatic_subs": [],
+            "entry_history": {"event": Gameweek, "points": Random.randint(20, 90), "bank": Random.randint(0, 30), "value": 1000, "event_transfers": 0, "event_transfers_cost": 0},
+            "picks": [
+                {"element": PlayerID, "position": Slot, "multiplier": (2 if Slot == Captain else 1) if Slot <= 11 else 0, "is_captain": Slot == Captain, "is_vice_captain": Slot == ViceCaptain}
+                for Slot, PlayerID in enumerate(Order, start=1)
+            ],
+        }
+
+    def History(self, EntryID):
+        # Season so far with a few chips already played
+        Random = random.Random(self.Seed * 1000003 + EntryID * 31)
+        Played = [(Chip, Random.randint(1, self.CurrentGameweek)) for Chip in Random.sample(["wildcard", "freehit", "bboost", "3xc"], Random.randint(0, 3))]
+        return {
+            "current": [{"event": Gameweek, "points": Random.randint(20, 90), "total_points": 0, "bank": Random.randint(0, 30), "value": 1000} for Gameweek in range(1, self.CurrentGameweek + 1)],
+            "chips": [{"name": Chip, "time": self.Events[Gameweek - 1]["deadline_time"], "event": Gameweek} for Chip, Gameweek in Played],
+        }
+
+    def LeagueStandings(self, LeagueID, Page):
+        # Between 10 and 199 entries, 50 to a page like the real endpoint
+        Size = 10 + (LeagueID * 37) % 190
+        Random = random.Random(self.Seed * 1000003 + LeagueID * 101)
+        Totals = sorted((Random.randint(200, 700) for _ in range(Size)), reverse=True)
+        Rows = [{
+            "id": LeagueID * 1000 + Rank,
+            "entry": LeagueID * 1000 + Rank,
+            "entry_name": f"Stand-in XI {LeagueID * 1000 + Rank}",
+            "player_name": f"Test Manager {LeagueID * 1000 + Rank}",
+            "rank": Rank,
+            "last_rank": Rank,
+            "total": Total,
+            "event_total": Random.randint(20, 90),
+        } for Rank, Total in enumerate(Totals, start=1)]
+        return {
+            "league": {"id": LeagueID, "name": f"Stand-in League {LeagueID}"},
+            "standings": {"has_next": Page * 50 < Size, "page": Page, "results": Rows[(Page - 1) * 50:Page * 50]},
+        }
+
+    def Live(self, Gameweek):
+        Random = random.Random(self.Seed * 1000003 + Gameweek * 7919)
+        Fixtures = {Fixture["team_h"]: Fixture for Fixture in self.Fixtures if Fixture["event"] == Gameweek}
+        Fixtures.update({Fixture["team_a"]: Fixture for Fixture in self.Fixtures if Fixture["event"] == Gameweek})
+        Elements = []
+        for Player in self.Elements:
+            Minutes = Random.choice([0, 45, 90]) if Gameweek <= self.CurrentGameweek else 0
+            Points = (2 if Minutes >= 60 else 1 if Minutes else 0) + (Random.choices([0, 4, 5, 6], weights=[85, 5, 5, 5])[0] if Minutes else 0)
+            Fixture = Fixtures.get(Player["team"])
+            Elements.append({
+                "id": Player["id"],
+                "stats": {"minutes": Minutes, "total_points": Points, "bps": Random.randint(0, 40) if Minutes else 0, "bonus": 0},
+                "explain": [{"fixture": Fixture["id"], "stats": [{"identifier": "minutes", "points": Points, "value": Minutes}]}] if Fixture else [],
+            })
+        return {"elements": Elements}
+
+    def Get(self, Path):
+        # Resolve an API path to a generated document, None when there is nothing there
+        Path, _, QueryString = Path.partition("?")
+        Query = dict(Pair.split("=", 1) for Pair in QueryString.split("&") if "=" in Pair)
+        Parts = Path.strip("/").split("/")
+        try:
+            if Parts == ["bootstrap-static"]:
+                return self.BootstrapStatic()
+            if Parts == ["fixtures"]:
+                return self.Fixtures
+            if len(Parts) == 2 and Parts[0] == "element-summary":
+                return self.ElementSummary(int(Parts[1]))
+            if len(Parts) == 2 and Parts[0] == "entry":
+                return self.Entry(int(Parts[1]))
+            if len(Parts) == 5 and Parts[0] == "entry" and Parts[2] == "event" and Parts[4] == "picks":
+                return self.Picks(int(Parts[1]), int(Parts[3]))
+            if len(Parts) == 3 and Parts[0] == "entry" and Parts[2] == "history":
+                return self.History(int(Parts[1]))
+            if len(Parts) == 3 and Parts[0] == "leagues-classic" and Parts[2] == "standings":
+                return self.LeagueStandings(int(Parts[1]), int(Query.get("page_standings", 1)))
+            if len(Parts) == 3 and Parts[0] == "event" and Parts[2] == "live":
+                return self.Live(int(Parts[1]))
+        except ValueError:
+            return None
+        return None
+
+class RecordedData():
+    def __init__(self, CassettePath):
+        # Serve a cassette recorded by the Scraper back over HTTP
+        self.Responses = GetCassette(CassettePath, "replay").Responses
+
+    def Get(self, Path):
+        return self.Responses.get(Path.lstrip("/"))
+
+def ParseTime(Value):
+    return datetime.fromisoformat(Value.replace("Z", "+00:00"))
+
+def CreateApp(Data, LatencyMs=0, JitterMs=0, ErrorRate=0.0, ErrorStatus=503):
+    StandIn = Flask(__name__)
+    Bodies = {}
+
+    @StandIn.route("/api/<path:Path>")
+    def Serve(Path):
+        # Upstream latency and failures are simulated before anything is served
+        Delay = random.gauss(LatencyMs, JitterMs) if JitterMs else LatencyMs
+        if Delay > 0:
+            time.sleep(Delay / 1000)
+        if ErrorRate and random.random() < ErrorRate:
+            Headers = {"Retry-After": "1"} if ErrorStatus == 429 else {}
+            return Response("Injected failure", status=ErrorStatus, headers=Headers)
+
+        if not Path.endswith("/"):
+            Path += "/"
+        if request.query_string:
+            Path += "?" + request.query_string.decode("utf-8")
+        if Path not in Bodies:
+            Document = Data.Get(Path)
+            if Document is None:
+                abort(404)
+            Body = json.dumps(Document, separators=(",", ":"))
+            Bodies[Path] = (Body, '"' + hashlib.sha1(Body.encode("utf-8")).hexdigest() + '"')
+        Body, ETag = Bodies[Path]
+
+        if request.headers.get("If-None-Match") == ETag:
+            return Response(status=304, headers={"ETag": ETag})
+        return Response(Body, mimetype="application/json", headers={"ETag": ETag})
+
+    return StandIn
+
+if __name__ == "__main__":
+    Parser = argparse.ArgumentParser(description="Serve a local stand-in for the FPL API")
+    Parser.add_argument("--host", default="127.0.0.1")
+    Parser.add_argument("--port", type=int, default=8001)
+    Parser.add_argument("--cassette", help="serve a recorded cassette instead of generated data")
+    Parser.add_argument("--seed", type=int, default=0, help="seed for generated data")
+    Parser.add_argument("--current-gameweek", type=int, default=10)
+    Parser.add_argument("--players-per-team", type=int, default=30)
+    Parser.add_argument("--latency-ms", type=float, default=0, help="mean delay added to every response")
+    Parser.add_argument("--jitter-ms", type=float, default=0, help="standard deviation of the added delay")
+    Parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    Parser.add_argument("--error-status", type=int, default=503)
+    Arguments = Parser.parse_args()
+
+    if Arguments.cassette:
+        Data = RecordedData(Arguments.cassette)
+    else:
+        Data = GeneratedData(Arguments.seed, Arguments.current_gameweek, Arguments.players_per_team)
+    StandIn = CreateApp(Data, Arguments.latency_ms, Arguments.jitter_ms, Arguments.error_rate, Arguments.error_status)
+    StandIn.run(host=Arguments.host, port=Arguments.port, threaded=True)
@@ -0,0 +1,101 @@
+#Captaincy, effective ownership, differentials and chip advice for every entry in a classic mini-league
+#Standings pages, picks and histories are fetched concurrently through the Scraper's rate limiter
+#Ownership is counted once over a picks matrix of every entry rather than entry by entry
+import numpy as np
+from lineup import RecommendLineup
+
+# Every squad is 15 picks, anything else the API sends is cut down or padded with empty picks to fit the matrix
+SquadSize = 15
+EmptyPick = {"element": 0, "multiplier": 0}
+
+Chips = {"wildcard": "Wildcard", "freehit": "Free Hit", "bboost": "Bench Boost", "3xc": "Triple Captain"}
+# A starter owned by at most this share of the league counts as a differential
+DifferentialOwnership = 0.25
+
+def FetchLeague(Scraper, LeagueID, Gameweek, Concurrency=8):
+    # League details, standings rows and every member's picks and history, entries that fail to load are left out
+    # Truncated is set when the league has more entries than the standings pages fetched
+    League, Standings, Truncated = Scraper.FetchLeagueStandings(LeagueID, Concurrency)
+    EntryIDs = [Row["entry"] for Row in Standings]
+    PicksByEntry = {EntryID: Picks for EntryID, Picks, Error in Scraper.FetchTeamPicks(EntryIDs, Gameweek, Concurrency) if not Error}
+    HistoriesByEntry = {EntryID: History for EntryID, History, Error in Scraper.FetchTeamHistories(EntryIDs, Concurrency) if not Error}
+    return League, Standings, PicksByEntry, HistoriesByEntry, Truncated
+
+def GetSquadPicks(Picks):
+    # Exactly SquadSize picks, padding uses element 0, which no player has
+    Picks = Picks[:SquadSize]
+    return Picks + [EmptyPick] * (SquadSize - len(Picks))
+
+def GetRemainingChips(History):
+    Played = {Chip["name"] for Chip in (History or {}).get("chips", [])}
+    return [Chip for Chip in Chips if Chip not in Played]
+
+def GetChipAdvice(RemainingChips, BenchPoints, UnavailablePlayers, NextDoubleGameweek):
+    # The same rules the team page uses, applied to each member of the league
+    if UnavailablePlayers > 2 and ("wildcard" in RemainingChips or "freehit" in RemainingChips):
+        return f"{UnavailablePlayers} players are injured or suspended, play your {'Wildcard' if 'wildcard' in RemainingChips else 'Free Hit'}."
+    if NextDoubleGameweek and "3xc" in RemainingChips:
+        return f"Save your Triple Captain for double gameweek {NextDoubleGameweek}."
+    if BenchPoints > 10 and "bboost" in RemainingChips:
+        return f"Your bench scored {BenchPoints} last gameweek, consider your Bench Boost."
+    return "Hold your chips this week."
+
+def AnalyseLeague(Snapshot, Standings, PicksByEntry, HistoriesByEntry, StatsByID, PlayerPositions, CurrentGameweek, NextDoubleGameweek=None, TopPlayers=15):
+    # Standings rows come back in league order, entries without picks are skipped
+    Rows = [Row for Row in Standings if PicksByEntry.get(Row["entry"], {}).get("picks")]
+    if not Rows:
+        return {"Entries": [], "Players": [], "Size": 0}
+
+    # Picks matrix of element IDs and their multipliers, one row of SquadSize picks per entry
+    SquadPicks = [GetSquadPicks(PicksByEntry[Row["entry"]]["picks"]) for Row in Rows]
+    Picks = np.array([[Pick["element"] for Pick in EntryPicks] for EntryPicks in SquadPicks], dtype=np.int64)
+    Multipliers = np.array([[Pick["multiplier"] for Pick in EntryPicks] for EntryPicks in SquadPicks], dtype=np.int64)
+    Captains = np.array([next((Pick["element"] for Pick in PicksByEntry[Row["entry"]]["picks"] if Pick.get("is_captain")), 0) for Row in Rows], dtype=np.int64)
+    EntryCount = len(Rows)
+    PlayerCount = max(max(Snapshot.PlayersByID) if Snapshot.PlayersByID else 0, int(Picks.max())) + 1
+
+    Ownership = np.bincount(Picks.ravel(), minlength=PlayerCount) / EntryCount
+    # Effective ownership counts a captain twice, a triple captain three times and the bench not at all
+    EffectiveOwnership = np.bincount(Picks.ravel(), weights=Multipliers.ravel(), minlength=PlayerCount) / EntryCount
+    Captaincy = np.bincount(Captains[Captains > 0], minlength=PlayerCount) / EntryCount
+
+    EventPoints = np.zeros(PlayerCount, dtype=np.int64)
+    Unavailable = np.zeros(PlayerCount, dtype=bool)
+    for PlayerID, Player in Snapshot.PlayersByID.items():
+        EventPoints[PlayerID] = Player.get("event_points") or 0
+        Unavailable[PlayerID] = Player.get("status") in ("i", "s")
+    BenchPoints = (EventPoints[Picks] * (Multipliers == 0)).sum(axis=1)
+    UnavailablePlayers = Unavailable[Picks].sum(axis=1)
+    # A starter is a differential when few others in the league own them
+    Differentials = (Picks > 0) & (Multipliers > 0) & (Ownership[Picks] <= DifferentialOwnership)
+
+    GetName = lambda PlayerID: (Snapshot.GetPlayer(PlayerID) or {}).get("web_name", str(PlayerID))
+    Entries = []
+    for Index, Row in enumerate(Rows):
+        PlayerIDs = [int(PlayerID) for PlayerID in Picks[Index] if PlayerID]
+        Recommendation = RecommendLineup(PlayerIDs, StatsByID, PlayerPositions, CurrentGameweek)
+        Captain = int(Captains[Index])
+        RemainingChips = GetRemainingChips(HistoriesByEntry.get(Row["entry"]))
+        Entries.append({
+            "EntryID": Row["entry"],
+            "EntryName": Row["entry_name"],
+            "PlayerName": Row["player_name"],
+            "Rank": Row["rank"],
+            "Total": Row["total"],
+            "Captain": GetName(Captain) if Captain else None,
+            "CaptainShare": round(float(Captaincy[Captain]) * 100),
+            "RecommendedCaptain": GetName(Recommendation["Captain"]) if Recommendation["Captain"] else None,
+            "Differentials": [GetName(int(PlayerID)) for PlayerID in Picks[Index][Differentials[Index]]],
+            "RemainingChips": [Chips[Chip] for Chip in RemainingChips],
+            "ChipAdvice": GetChipAdvice(RemainingChips, int(BenchPoints[Index]), int(UnavailablePlayers[Index]), NextDoubleGameweek),
+        })
+
+    # Most effectively owned players first, these are the ones a rival can't afford to be without
+    Order = np.argsort(-EffectiveOwnership, kind="stable")[:TopPlayers]
+    Players = [{
+        "Name": GetName(int(PlayerID)),
+        "Ownership": round(float(Ownership[PlayerID]) * 100),
+        "EffectiveOwnership": round(float(EffectiveOwnership[PlayerID]) * 100),
+        "Captaincy": round(float(Captaincy[PlayerID]) * 100),
+    } for PlayerID in Order if PlayerID and Ownership[PlayerID] > 0]
+    return {"Entries": Entries, "Players": Players, "Size": EntryCount}
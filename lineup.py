@@ -0,0 +1,154 @@
+#Captaincy, starting XI and bench recommendations for one squad or thousands of them
+#python lineup.py 123 456 789              - recommendations for these FPL entries
+#python lineup.py --entries-file ids.txt   - one entry ID per line, written as JSON lines to --output
+#Player stats and positions are loaded once and shared by every squad
+import argparse
+import json
+import os
+import sys
+
+# Stats a player is ranked on for the captaincy, a higher value earns a better (lower) rank
+CaptainStats = ("RecentPoints", "RecentGoals", "RecentAssists", "TeamRecentPoints")
+# Players without a next fixture can't be captained, so they're pushed to the back
+NoFixtureDifficulty = 999
+
+def GetSquadStats(PlayerIDs, StatsByID, CurrentGameweek):
+    # The squad's up to date stats rows ordered by PlayerID, injured and suspended players included
+    return [StatsByID[PlayerID] for PlayerID in sorted(set(PlayerIDs)) if PlayerID in StatsByID and StatsByID[PlayerID].CurrentGameweek == CurrentGameweek]
+
+def GetTeamStats(PlayerIDs, StatsByID, CurrentGameweek):
+    # The squad's up to date stats rows ordered by PlayerID, leaving out injured and suspended players
+    return [PlayerStat for PlayerStat in GetSquadStats(PlayerIDs, StatsByID, CurrentGameweek) if not PlayerStat.Injured and not PlayerStat.Suspended]
+
+def ScoreCaptains(TeamStats):
+    # Rank-sum captaincy score for each player, lower is better
+    PlayerScores = []
+    for PlayerStat in TeamStats:
+        PlayerCaptainStats = {StatName: getattr(PlayerStat, StatName) for StatName in CaptainStats}
+        PlayerCaptainStats["PlayerID"] = PlayerStat.PlayerID
+        PlayerCaptainStats["NextFixtureDifficulty"] = PlayerStat.NextFixtureDifficulty if PlayerStat.NextFixtureDifficulty != None else NoFixtureDifficulty
+        PlayerCaptainStats["CaptainScore"] = 0
+        PlayerScores.append(PlayerCaptainStats)
+
+    for StatName in CaptainStats:
+        SortedPlayers = sorted(PlayerScores, key=lambda x: x[StatName], reverse=True)
+        for Index, Player in enumerate(SortedPlayers):
+            Player["CaptainScore"] += Index + 1
+    for Player in PlayerScores:
+        Player["CaptainScore"] += Player["NextFixtureDifficulty"]
+    return PlayerScores
+
+def PickCaptains(PlayerScores):
+    # Best and second best captaincy scores, either can be None for a squad with too few available players
+    BestCaptain = min(PlayerScores, key=lambda x: x["CaptainScore"]) if PlayerScores else None
+    RemainingPlayers = [Player for Player in PlayerScores if Player["PlayerID"] != BestCaptain["PlayerID"]] if BestCaptain else []
+    BestViceCaptain = min(RemainingPlayers, key=lambda x: x["CaptainScore"]) if RemainingPlayers else None
+    return BestCaptain, BestViceCaptain
+
+def RecommendStartingXI(TeamStats, PlayerPositions):
+    # Fill the minimum goalkeeper, defenders and forward and every midfielder by recent points, then top up with outfield players
+    SortedPlayersByPoints = sorted(TeamStats, key=lambda x: x.RecentPoints, reverse=True)
+    Goalkeepers = 0
+    Defenders = 0
+    Forwards = 0
+    RecommendedStartingPlayers = []
+    MinGoalkeepers = 1
+    MinDefenders = 3
+    MinForwards = 1
+    PlayerPosition = None
+    for PlayerStat in SortedPlayersByPoints:
+        if len(RecommendedStartingPlayers) < 11:
+            PlayerPosition = PlayerPositions.get(PlayerStat.PlayerID)
+
+        if PlayerPosition == 1 and Goalkeepers < MinGoalkeepers:
+            RecommendedStartingPlayers.append(PlayerStat.PlayerID)
+            Goalkeepers += 1
+        elif PlayerPosition == 2 and Defenders < MinDefenders:
+            RecommendedStartingPlayers.append(PlayerStat.PlayerID)
+            Defenders += 1
+        elif PlayerPosition == 4 and Forwards < MinForwards:
+            RecommendedStartingPlayers.append(PlayerStat.PlayerID)
+            Forwards += 1
+        elif PlayerPosition == 3:
+            RecommendedStartingPlayers.append(PlayerStat.PlayerID)
+
+    if len(RecommendedStartingPlayers) < 11:
+        SortedPlayersByPoints = [PlayerStat for PlayerStat in SortedPlayersByPoints if PlayerStat.PlayerID not in RecommendedStartingPlayers]
+        while len(RecommendedStartingPlayers) < 11 and SortedPlayersByPoints:
+            NextPlayer = SortedPlayersByPoints.pop(0)
+            if PlayerPositions.get(NextPlayer.PlayerID) != 1:
+                RecommendedStartingPlayers.append(NextPlayer.PlayerID)
+    return RecommendedStartingPlayers
+
+def OrderBench(PlayerIDs, StartingXI, StatsByID, PlayerPositions):
+    # Substitute goalkeeper first, then outfield players by recent points
+    Bench = [PlayerID for PlayerID in PlayerIDs if PlayerID not in StartingXI]
+    RecentPoints = lambda PlayerID: StatsByID[PlayerID].RecentPoints if PlayerID in StatsByID else -1
+    return sorted(Bench, key=lambda PlayerID: (PlayerPositions.get(PlayerID) != 1, -RecentPoints(PlayerID)))
+
+def RecommendLineup(PlayerIDs, StatsByID, PlayerPositions, CurrentGameweek):
+    # Captain, vice captain, starting XI and bench order for one squad of PlayerIDs
+    # Only available players can captain, while the XI is picked from the whole squad
+    BestCaptain, BestViceCaptain = PickCaptains(ScoreCaptains(GetTeamStats(PlayerIDs, StatsByID, CurrentGameweek)))
+    StartingXI = RecommendStartingXI(GetSquadStats(PlayerIDs, StatsByID, CurrentGameweek), PlayerPositions)
+    return {
+        "Captain": BestCaptain["PlayerID"] if BestCaptain else None,
+        "ViceCaptain": BestViceCaptain["PlayerID"] if BestViceCaptain else None,
+        "StartingXI": StartingXI,
+        "Bench": OrderBench(PlayerIDs, StartingXI, StatsByID, PlayerPositions),
+    }
+
+def RecommendLineups(Scraper, EntryIDs, StatsByID, PlayerPositions, CurrentGameweek, Concurrency=8):
+    # Picks are downloaded on a thread pool, yields (EntryID, Recommendation, Error) as each one finishes
+    for EntryID, TeamData, Error in Scraper.FetchTeamPicks(EntryIDs, CurrentGameweek, Concurrency):
+        if Error:
+            yield EntryID, None, Error
+            continue
+        PlayerIDs = [Pick["element"] for Pick in TeamData.get("picks", [])]
+        yield EntryID, RecommendLineup(PlayerIDs, StatsByID, PlayerPositions, CurrentGameweek), None
+
+def LoadPlayerData():
+    # Every player's stats row and position in two queries
+    from app import db, Players, PlayerStats
+    StatsByID = {PlayerStat.PlayerID: PlayerStat for PlayerStat in db.session.query(
+        PlayerStats.PlayerID, PlayerStats.CurrentGameweek, PlayerStats.Injured, PlayerStats.Suspended,
+        PlayerStats.NextFixtureDifficulty, *[getattr(PlayerStats, StatName) for StatName in CaptainStats]).all()}
+    Names = {}
+    PlayerPositions = {}
+    for PlayerID, Name, Position in db.session.query(Players.PlayerID, Players.Name, Players.Position).all():
+        Names[PlayerID] = Name
+        PlayerPositions[PlayerID] = Position
+    return StatsByID, PlayerPositions, Names
+
+if __name__ == "__main__":
+    Parser = argparse.ArgumentParser(description="Captaincy and lineup recommendations for many FPL entries")
+    Parser.add_argument("entries", nargs="*", type=int, help="FPL entry IDs")
+    Parser.add_argument("--entries-file", help="file with one FPL entry ID per line")
+    Parser.add_argument("--output", help="write JSON lines here instead of stdout")
+    Parser.add_argument("--concurrency", type=int, default=int(os.getenv("FPL_SCRAPER_CONCURRENCY", 8)))
+    Arguments = Parser.parse_args()
+
+    EntryIDs = list(Arguments.entries)
+    if Arguments.entries_file:
+        with open(Arguments.entries_file, encoding="utf-8") as File:
+            EntryIDs.extend(int(Line) for Line in File if Line.strip())
+
+    from app import app, scraper
+    with app.app_context():
+        StatsByID, PlayerPositions, Names = LoadPlayerData()
+    CurrentGameweek = scraper.GetCurrentGameweek()
+
+    Output = open(Arguments.output, "w", encoding="utf-8") if Arguments.output else sys.stdout
+    Failed = 0
+    for EntryID, Recommendation, Error in RecommendLineups(scraper, EntryIDs, StatsByID, PlayerPositions, CurrentGameweek, Arguments.concurrency):
+        if Error:
+            Failed += 1
+            print(f"Error fetching entry {EntryID}: {Error}", file=sys.stderr)
+            continue
+        Recommendation["EntryID"] = EntryID
+        Recommendation["CaptainName"] = Names.get(Recommendation["Captain"])
+        Recommendation["ViceCaptainName"] = Names.get(Recommendation["ViceCaptain"])
+        Output.write(json.dumps(Recommendation) + "\n")
+    if Output is not sys.stdout:
+        Output.close()
+    print(f"{len(EntryIDs) - Failed} of {len(EntryIDs)} entries done", file=sys.stderr)
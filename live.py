@@ -0,0 +1,158 @@
+#Live gameweek points for every squad open on a team page, pushed to the browser as server-sent events
+#One poller thread downloads event/{gw}/live/ once per interval for all players and scores every tracked squad from it
+#Provisional bonus is worked out from each fixture's BPS until the real bonus has been added
+import json
+import queue
+import threading
+
+# Bonus for the best three BPS scores in a fixture
+BonusAwards = (3, 2, 1)
+
+def GetProvisionalBonus(Elements):
+    # PlayerID -> provisional bonus, only for fixtures whose bonus isn't in the live points yet
+    FixturePlayers = {}
+    ConfirmedFixtures = set()
+    for Element in Elements:
+        Stats = Element.get("stats", {})
+        Explain = Element.get("explain") or []
+        if not Explain or not Stats.get("minutes"):
+            continue
+        # A double gameweek player's BPS can't be split between fixtures, so they're ranked in their first one
+        FixtureID = Explain[0]["fixture"]
+        FixturePlayers.setdefault(FixtureID, []).append((Stats.get("bps", 0), Element["id"]))
+        if Stats.get("bonus"):
+            ConfirmedFixtures.add(FixtureID)
+
+    Bonus = {}
+    for FixtureID, Players in FixturePlayers.items():
+        if FixtureID in ConfirmedFixtures:
+            continue
+        for BPS, PlayerID in Players:
+            # Players level on BPS share the higher award and push the next player down, e.g. 3, 3, 1
+            Rank = sum(1 for OtherBPS, OtherPlayerID in Players if OtherBPS > BPS)
+            if BPS > 0 and Rank < len(BonusAwards):
+                Bonus[PlayerID] = BonusAwards[Rank]
+    return Bonus
+
+def GetLivePoints(LiveData):
+    # PlayerID -> (points so far, provisional bonus, minutes) from one event/{gw}/live/ document
+    Elements = LiveData.get("elements", [])
+    Bonus = GetProvisionalBonus(Elements)
+    return {Element["id"]: (Element["stats"].get("total_points", 0), Bonus.get(Element["id"], 0), Element["stats"].get("minutes", 0)) for Element in Elements}
+
+def GetSquadScore(Picks, LivePoints, Snapshot):
+    # Live total of a squad's picks, the multiplier already covers the captain, triple captain, bench and Bench Boost
+    Players = []
+    Total = 0
+    for Pick in Picks:
+        Points, Bonus, Minutes = LivePoints.get(Pick["element"], (0, 0, 0))
+        Total += (Points + Bonus) * Pick["multiplier"]
+        Players.append({
+            "PlayerID": Pick["element"],
+            "Name": (Snapshot.GetPlayer(Pick["element"]) or {}).get("web_name", str(Pick["element"])),
+            "Points": Points,
+            "Bonus": Bonus,
+            "Minutes": Minutes,
+            "Multiplier": Pick["multiplier"],
+        })
+    return {"Total": Total, "Players": Players}
+
+class LiveFeed():
+    def __init__(self, Scraper, Interval=30):
+        self.Scraper = Scraper
+        # Seconds between polls of the live endpoint, matching how long the Scraper treats a live response as fresh
+        self.Interval = Interval
+        # Open streams as update queue -> TeamID
+        self.Subscribers = {}
+        # Picks of each tracked squad as TeamID -> (gameweek, picks), and the last score sent to its pages
+        self.Squads = {}
+        self.Latest = {}
+        self.Lock = threading.Lock()
+        # Set to poll straight away when a page opens for a squad that hasn't been scored yet
+        self.Wakeup = threading.Event()
+        self.Thread = None
+
+    def Subscribe(self, TeamID):
+        Updates = queue.Queue()
+        with self.Lock:
+            self.Subscribers[Updates] = TeamID
+            if TeamID in self.Latest:
+                Updates.put(self.Latest[TeamID])
+            else:
+                self.Wakeup.set()
+            # The poller only runs while at least one page is open
+            if self.Thread is None:
+                self.Thread = threading.Thread(target=self.Run, name="LiveFeed", daemon=True)
+                self.Thread.start()
+        return Updates
+
+    def Unsubscribe(self, Updates):
+        with self.Lock:
+            self.Subscribers.pop(Updates, None)
+
+    def GetPicks(self, TeamID, Gameweek):
+        # Picks can't change once the deadline has passed, so each squad is downloaded once per gameweek
+        Squad = self.Squads.get(TeamID)
+        if Squad is None or Squad[0] != Gameweek:
+            Squad = (Gameweek, self.Scraper.GetTeamPicks(TeamID, Gameweek).get("picks", []))
+            self.Squads[TeamID] = Squad
+        return Squad[1]
+
+    def Poll(self):
+        # One live download scores every tracked squad, only changed scores are pushed
+        Gameweek = self.Scraper.GetCurrentGameweek()
+        LivePoints = GetLivePoints(self.Scraper.GetLiveEvent(Gameweek))
+        Snapshot = self.Scraper.GetBootstrapSnapshot()
+        with self.Lock:
+            TeamIDs = set(self.Subscribers.values())
+        for TeamID in TeamIDs:
+            try:
+                Picks = self.GetPicks(TeamID, Gameweek)
+            except Exception as e:
+                print(f"Error fetching picks for team {TeamID}: {e}")
+                continue
+            Score = GetSquadScore(Picks, LivePoints, Snapshot)
+            Score["TeamID"] = TeamID
+            Score["Gameweek"] = Gameweek
+            with self.Lock:
+                if self.Latest.get(TeamID) == Score:
+                    continue
+                self.Latest[TeamID] = Score
+                for Updates, SubscribedTeamID in self.Subscribers.items():
+                    if SubscribedTeamID == TeamID:
+                        Updates.put(Score)
+
+        # Forget squads whose pages have all been closed
+        with self.Lock:
+            TeamIDs = set(self.Subscribers.values())
+            for TeamID in set(self.Squads) - TeamIDs:
+                self.Squads.pop(TeamID, None)
+            for TeamID in set(self.Latest) - TeamIDs:
+                self.Latest.pop(TeamID, None)
+
+    def Run(self):
+        while True:
+            with self.Lock:
+                if not self.Subscribers:
+                    self.Thread = None
+                    return
+            self.Wakeup.clear()
+            try:
+                self.Poll()
+            except Exception as e:
+                print(f"Error polling live points: {e}")
+            self.Wakeup.wait(self.Interval)
+
+    def Stream(self, TeamID, Heartbeat=15):
+        # Server-sent events for one page, a comment line is sent while idle so proxies keep the stream open
+        Updates = self.Subscribe(TeamID)
+        try:
+            while True:
+                try:
+                    Score = Updates.get(timeout=Heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(Score)}\n\n"
+        finally:
+            self.Unsubscribe(Updates)
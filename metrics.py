@@ -0,0 +1,172 @@
+#Request-scoped instrumentation of upstream FPL calls, SQL queries and template rendering for every Flask route
+#Aggregated histograms are exposed in the Prometheus text format by the /metrics route in app.py
+import re
+import threading
+import time
+from functools import wraps
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+# Bucket upper bounds in seconds for durations, and in calls for per-request counts
+DurationBuckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+CountBuckets = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf"))
+
+class Histogram():
+    def __init__(self, Name, Help, LabelNames, Buckets):
+        self.Name = Name
+        self.Help = Help
+        self.LabelNames = LabelNames
+        self.Buckets = Buckets
+        # Label values -> [bucket counts..., sum, count]
+        self.Series = {}
+        self.Lock = threading.Lock()
+
+    def Observe(self, Labels, Value):
+        with self.Lock:
+            Series = self.Series.setdefault(Labels, [0] * len(self.Buckets) + [0.0, 0])
+            for Index, UpperBound in enumerate(self.Buckets):
+                if Value <= UpperBound:
+                    Series[Index] += 1
+            Series[-2] += Value
+            Series[-1] += 1
+
+    def Render(self):
+        Lines = [f"# HELP {self.Name} {self.Help}", f"# TYPE {self.Name} histogram"]
+        with self.Lock:
+            for Labels, Series in sorted(self.Series.items()):
+                LabelText = ",".join(f'{Name}="{EscapeLabel(Value)}"' for Name, Value in zip(self.LabelNames, Labels))
+                Separator = "," if LabelText else ""
+                for UpperBound, Count in zip(self.Buckets, Series):
+                    Bound = "+Inf" if UpperBound == float("inf") else repr(UpperBound)
+                    Lines.append(f'{self.Name}_bucket{{{LabelText}{Separator}le="{Bound}"}} {Count}')
+                Lines.append(f"{self.Name}_sum{{{LabelText}}} {Series[-2]}")
+                Lines.append(f"{self.Name}_count{{{LabelText}}} {Series[-1]}")
+        return Lines
+
+def EscapeLabel(Value):
+    return str(Value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+RequestDuration = Histogram("fplhelper_request_duration_seconds", "Time spent handling a Flask request.", ("route", "method", "status"), DurationBuckets)
+UpstreamDuration = Histogram("fplhelper_upstream_request_duration_seconds", "Time spent on one upstream FPL API call.", ("endpoint", "status"), DurationBuckets)
+UpstreamPerRequest = Histogram("fplhelper_upstream_calls_per_request", "Upstream FPL API calls made while handling a request.", ("route",), CountBuckets)
+UpstreamTimePerRequest = Histogram("fplhelper_upstream_seconds_per_request", "Total upstream FPL API time while handling a request.", ("route",), DurationBuckets)
+SQLDuration = Histogram("fplhelper_sql_query_duration_seconds", "Time spent on one SQL statement.", ("route",), DurationBuckets)
+SQLPerRequest = Histogram("fplhelper_sql_queries_per_request", "SQL statements issued while handling a request.", ("route",), CountBuckets)
+SQLTimePerRequest = Histogram("fplhelper_sql_seconds_per_request", "Total SQL time while handling a request.", ("route",), DurationBuckets)
+RenderDuration = Histogram("fplhelper_template_render_seconds", "Time spent rendering a template.", ("route", "template"), DurationBuckets)
+
+Histograms = [
+    RequestDuration, UpstreamDuration, UpstreamPerRequest, UpstreamTimePerRequest,
+    SQLDuration, SQLPerRequest, SQLTimePerRequest, RenderDuration,
+]
+
+class RequestTotals():
+    # Upstream and SQL totals for one request, added to from the request's thread and any fetch workers it starts
+    def __init__(self):
+        self.UpstreamCalls = 0
+        self.UpstreamSeconds = 0.0
+        self.SQLQueries = 0
+        self.SQLSeconds = 0.0
+        self.Lock = threading.Lock()
+
+    def AddUpstream(self, Seconds):
+        with self.Lock:
+            self.UpstreamCalls += 1
+            self.UpstreamSeconds += Seconds
+
+    def AddSQL(self, Seconds):
+        with self.Lock:
+            self.SQLQueries += 1
+            self.SQLSeconds += Seconds
+
+# The route and totals a fetch worker thread is currently working for, set by BindWorker
+Worker = threading.local()
+
+def GetRoute():
+    # The route pattern rather than the raw path, so /team?teamID=1 and /team?teamID=2 share one series
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    if not has_request_context():
+        return getattr(Worker, "Route", None) or "background"
+    return "unmatched"
+
+def GetTotals():
+    # The totals of the request being served, from this thread or the one that handed it work
+    if has_request_context():
+        return g.get("MetricsTotals")
+    return getattr(Worker, "Totals", None)
+
+def BindWorker(Function):
+    # Capture the submitting request's route and totals so calls made on a worker thread count towards that request
+    if not has_request_context() or "MetricsTotals" not in g:
+        return Function
+    Route, Totals = GetRoute(), g.MetricsTotals
+    @wraps(Function)
+    def Bound(*args, **kwargs):
+        Worker.Route, Worker.Totals = Route, Totals
+        try:
+            return Function(*args, **kwargs)
+        finally:
+            Worker.Route, Worker.Totals = None, None
+    return Bound
+
+def GetEndpointLabel(Path):
+    # element-summary/123/ -> element-summary/{id}/
+    return re.sub(r"\d+", "{id}", Path.split("?")[0])
+
+def StartRequest():
+    g.MetricsStart = time.perf_counter()
+    g.MetricsTotals = RequestTotals()
+
+def FinishRequest(response):
+    if "MetricsStart" in g:
+        Route = GetRoute()
+        RequestDuration.Observe((Route, request.method, str(response.status_code)), time.perf_counter() - g.MetricsStart)
+        Totals = g.MetricsTotals
+        UpstreamPerRequest.Observe((Route,), Totals.UpstreamCalls)
+        UpstreamTimePerRequest.Observe((Route,), Totals.UpstreamSeconds)
+        SQLPerRequest.Observe((Route,), Totals.SQLQueries)
+        SQLTimePerRequest.Observe((Route,), Totals.SQLSeconds)
+    return response
+
+def ObserveUpstream(Path, StatusCode, Seconds):
+    UpstreamDuration.Observe((GetEndpointLabel(Path), str(StatusCode)), Seconds)
+    Totals = GetTotals()
+    if Totals:
+        Totals.AddUpstream(Seconds)
+
+def BeforeExecute(Connection, Cursor, Statement, Parameters, Context, ExecuteMany):
+    Connection.info.setdefault("QueryStart", []).append(time.perf_counter())
+
+def AfterExecute(Connection, Cursor, Statement, Parameters, Context, ExecuteMany):
+    Seconds = time.perf_counter() - Connection.info["QueryStart"].pop()
+    SQLDuration.Observe((GetRoute(),), Seconds)
+    Totals = GetTotals()
+    if Totals:
+        Totals.AddSQL(Seconds)
+
+def BeforeRender(Sender, template, context, **Extra):
+    if has_request_context():
+        g.RenderStart = time.perf_counter()
+
+def AfterRender(Sender, template, context, **Extra):
+    if has_request_context() and "RenderStart" in g:
+        RenderDuration.Observe((GetRoute(), template.name or "string"), time.perf_counter() - g.pop("RenderStart"))
+
+def Instrument(app, db, scraper):
+    # Hook the Flask request cycle, the SQLAlchemy engine, template rendering and the Scraper's upstream calls
+    app.before_request(StartRequest)
+    app.after_request(FinishRequest)
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", BeforeExecute)
+        event.listen(db.engine, "after_cursor_execute", AfterExecute)
+    before_render_template.connect(BeforeRender, app)
+    template_rendered.connect(AfterRender, app)
+    scraper.RequestListeners.append(ObserveUpstream)
+    scraper.WorkerWrappers.append(BindWorker)
+
+def Render():
+    Lines = []
+    for Metric in Histograms:
+        Lines.extend(Metric.Render())
+    return "\n".join(Lines) + "\n"
@@ -0,0 +1,97 @@
+#Best 15-man squad and starting XI for a projected score, solved exactly as a mixed integer program
+#Every player has three binary variables: on the bench, in the starting XI and captain, the squad is the bench and XI together
+import numpy as np
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+# 4 - Forward, 3 - Midfielder, 2 - Defender, 1 - Goalkeeper
+SquadQuotas = {1: 2, 2: 5, 3: 5, 4: 3}
+# Fewest and most starters per position allowed by a valid formation
+FormationLimits = {1: (1, 1), 2: (3, 5), 3: (2, 5), 4: (1, 3)}
+StartingSize = 11
+MaxPerClub = 3
+# Clubs the other 14 squad players can fill to MaxPerClub, none of their players can be swapped in
+FullClubs = (sum(SquadQuotas.values()) - 1) // MaxPerClub
+
+def GetCandidates(Positions, TeamIDs, Prices, Projections):
+    # Mask of the players worth keeping in the pool, dropping the rest can't change the best squad
+    # A player is dropped when a player at least as good for no more money can always take their place
+    # At worst the rest of the squad fills the FullClubs clubs with the most such players and holds Quota - 1 of the others
+    Keep = np.ones(len(Positions), dtype=bool)
+    for Position, Quota in SquadQuotas.items():
+        Indices = np.flatnonzero(Positions == Position)
+        Price, Projection = Prices[Indices], Projections[Indices]
+        # Dominates[i, j] when player i is at least as good as j for no more money, identical players are ordered by index
+        Dominates = (Price[:, None] <= Price[None, :]) & (Projection[:, None] >= Projection[None, :]) & (
+            (Price[:, None] < Price[None, :]) | (Projection[:, None] > Projection[None, :]) | (Indices[:, None] < Indices[None, :]))
+        ClubIDs, Clubs = np.unique(TeamIDs[Indices], return_inverse=True)
+        # Dominating players of each player by club, a player's own club always has room once they leave it
+        Counts = np.array([Dominates[Clubs == Club].sum(axis=0) for Club in range(len(ClubIDs))])
+        Players = np.arange(len(Indices))
+        OwnClub = Counts[Clubs, Players].copy()
+        Counts[Clubs, Players] = 0
+        Blocked = -np.sort(-Counts, axis=0)[:FullClubs].sum(axis=0)
+        Keep[Indices] = Counts.sum(axis=0) + OwnClub - Blocked <= Quota - 1
+    return Keep
+
+def OptimizeSquad(PlayerIDs, Positions, TeamIDs, Prices, Projections, Budget=100.0, BenchWeight=0.1, TimeLimit=1):
+    # Starters score their projection, the captain scores it twice and the bench counts for BenchWeight of theirs
+    # Returns None when no squad fits the budget and limits, Optimal is False when TimeLimit seconds ran out first
+    PlayerIDs = np.asarray(PlayerIDs, dtype=np.int64)
+    Positions = np.asarray(Positions, dtype=np.int64)
+    TeamIDs = np.asarray(TeamIDs, dtype=np.int64)
+    Prices = np.asarray(Prices, dtype=np.float64)
+    Projections = np.asarray(Projections, dtype=np.float64)
+    # Dominated players are dropped first, the solve time grows quickly with the pool
+    Keep = GetCandidates(Positions, TeamIDs, Prices, Projections)
+    PlayerIDs, Positions, TeamIDs, Prices, Projections = PlayerIDs[Keep], Positions[Keep], TeamIDs[Keep], Prices[Keep], Projections[Keep]
+    Count = len(PlayerIDs)
+    Nothing = np.zeros(Count)
+
+    # Variables are laid out as [Bench..., Starting..., Captain...], milp minimises so the objective is negated
+    # Splitting the squad into bench and XI rather than nesting the XI in it gives HiGHS a much tighter relaxation
+    Objective = -np.concatenate([BenchWeight * Projections, Projections, Projections])
+
+    Rows = []
+    Lower = []
+    Upper = []
+    def AddRow(Squad=Nothing, Starting=Nothing, Captain=Nothing, Minimum=-np.inf, Maximum=np.inf):
+        # Squad coefficients apply to the bench and the XI alike
+        Rows.append(np.concatenate([Squad, Squad + Starting, Captain]))
+        Lower.append(Minimum)
+        Upper.append(Maximum)
+
+    AddRow(Squad=Prices, Maximum=Budget)
+    for Position, Quota in SquadQuotas.items():
+        InPosition = (Positions == Position).astype(np.float64)
+        AddRow(Squad=InPosition, Minimum=Quota, Maximum=Quota)
+        AddRow(Starting=InPosition, Minimum=FormationLimits[Position][0], Maximum=FormationLimits[Position][1])
+    for TeamID in np.unique(TeamIDs):
+        AddRow(Squad=(TeamIDs == TeamID).astype(np.float64), Maximum=MaxPerClub)
+    AddRow(Starting=np.ones(Count), Minimum=StartingSize, Maximum=StartingSize)
+    AddRow(Captain=np.ones(Count), Minimum=1, Maximum=1)
+
+    # Nobody is both on the bench and starting, and only starters can captain
+    Identity = sparse.identity(Count, format="csr")
+    Empty = sparse.csr_matrix((Count, Count))
+    Constraints = [
+        LinearConstraint(sparse.csr_matrix(np.array(Rows)), Lower, Upper),
+        LinearConstraint(sparse.hstack([Identity, Identity, Empty]), -np.inf, 1),
+        LinearConstraint(sparse.hstack([Empty, -Identity, Identity]), -np.inf, 0),
+    ]
+    Result = milp(Objective, constraints=Constraints, integrality=np.ones(3 * Count), bounds=Bounds(0, 1), options={"time_limit": TimeLimit})
+    if Result.x is None:
+        return None
+
+    Starting = Result.x[Count:2 * Count] > 0.5
+    Squad = (Result.x[:Count] > 0.5) | Starting
+    Captain = int(np.flatnonzero(Result.x[2 * Count:] > 0.5)[0])
+    return {
+        "Squad": [int(PlayerID) for PlayerID in PlayerIDs[Squad]],
+        "Starting": [int(PlayerID) for PlayerID in PlayerIDs[Starting]],
+        "Bench": [int(PlayerID) for PlayerID in PlayerIDs[Squad & ~Starting]],
+        "Captain": int(PlayerIDs[Captain]),
+        "Cost": round(float(Prices[Squad].sum()), 1),
+        "ProjectedPoints": round(float(Projections[Starting].sum() + Projections[Captain]), 2),
+        "Optimal": Result.status == 0,
+    }
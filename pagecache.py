@@ -0,0 +1,47 @@
+#In-memory cache of rendered pages whose data only changes when the autoscraper refreshes the database
+#Each cached route names the tables it reads, their DataVersions counters decide whether a stored page is still current
+#Pages are served with an ETag so a browser that already has the current page gets a 304 instead
+import hashlib
+import threading
+from functools import wraps
+from flask import request, make_response, Response
+
+class PageCache():
+    def __init__(self, GetVersions, MaxEntries=64):
+        # GetVersions(Tables) returns the current version of each table, one query per request
+        self.GetVersions = GetVersions
+        self.MaxEntries = MaxEntries
+        # (path, query arguments) -> (versions, body, ETag, mimetype)
+        self.Entries = {}
+        self.Lock = threading.Lock()
+
+    def Cached(self, *Tables, Extra=None):
+        # Extra is an optional callable whose value is part of the key, for inputs that don't live in the database
+        def Decorator(View):
+            @wraps(View)
+            def Wrapper(*args, **kwargs):
+                Versions = (self.GetVersions(Tables), Extra() if Extra else None)
+                Key = (request.path, tuple(sorted(request.args.items(multi=True))))
+                with self.Lock:
+                    Entry = self.Entries.get(Key)
+                if Entry is None or Entry[0] != Versions:
+                    response = make_response(View(*args, **kwargs))
+                    # Only complete pages are kept, anything else is passed straight through
+                    if response.status_code != 200:
+                        return response
+                    Body = response.get_data()
+                    Entry = (Versions, Body, hashlib.md5(Body).hexdigest(), response.mimetype)
+                    with self.Lock:
+                        self.Entries.pop(Key, None)
+                        # Oldest first, so the page stored longest ago makes room
+                        while len(self.Entries) >= self.MaxEntries:
+                            self.Entries.pop(next(iter(self.Entries)))
+                        self.Entries[Key] = Entry
+
+                response = Response(Entry[1], mimetype=Entry[3])
+                response.set_etag(Entry[2])
+                # Browsers keep the page but check it is still current on every view
+                response.headers["Cache-Control"] = "no-cache"
+                return response.make_conditional(request)
+            return Wrapper
+        return Decorator
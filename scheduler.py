@@ -0,0 +1,117 @@
+#Background refresh of the database, paced by the gameweek deadlines and kickoff times in the FPL API
+#Live matches refresh every few minutes, the day before a deadline every half hour and quiet mid-week days a few times a day
+#Every refresh updates teams, fixtures, players and their prices, then refetches only the players whose data moved
+#Once a gameweek is finished and its data checked, every player's stats are refetched in full
+#Runs as its own process with python scheduler.py or python autoscraper.py --schedule, a lock file keeps it to one process
+import os
+import threading
+import time
+from scraper import ParseDeadline
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, msvcrt locks a byte of the file instead
+    fcntl = None
+    import msvcrt
+
+# Seconds between refreshes in each situation
+LiveInterval = 300
+DeadlineInterval = 1800
+IdleInterval = 21600
+# How long before a deadline refreshes speed up, and how long after kickoff a match counts as live
+DeadlineWindow = 86400
+MatchLength = 7200
+# Never sleep less than this, and wait this long before retrying a failed refresh
+MinimumWait = 60
+RetryInterval = 300
+
+def GetSchedule(Events, Fixtures, Now, LastFullRefreshGameweek):
+    # Returns (Action, Wait, Reason), Action is "full" or "incremental" and Wait the seconds until the next check
+    CurrentEvent = next((Event for Event in Events if Event.get("is_current")), None)
+    if CurrentEvent and CurrentEvent.get("finished") and CurrentEvent.get("data_checked") and CurrentEvent["id"] != LastFullRefreshGameweek:
+        return "full", MinimumWait, f"gameweek {CurrentEvent['id']} is finished"
+
+    Kickoffs = [ParseDeadline(Fixture.get("kickoff_time")) for Fixture in Fixtures if not Fixture.get("finished_provisional", Fixture.get("finished"))]
+    Kickoffs = [Kickoff for Kickoff in Kickoffs if Kickoff]
+    Deadlines = [ParseDeadline(Event.get("deadline_time")) for Event in Events]
+    NextKickoff = min((Kickoff for Kickoff in Kickoffs if Kickoff > Now), default=None)
+    NextDeadline = min((Deadline for Deadline in Deadlines if Deadline and Deadline > Now), default=None)
+
+    if any(Kickoff <= Now < Kickoff + MatchLength for Kickoff in Kickoffs):
+        Interval, Reason = LiveInterval, "matches are live"
+    elif NextDeadline and NextDeadline - Now < DeadlineWindow:
+        Interval, Reason = DeadlineInterval, "the deadline is close"
+    else:
+        Interval, Reason = IdleInterval, "nothing is happening"
+
+    # Wake up for the next kickoff or deadline rather than sleeping through it
+    Wait = min([Interval] + [Moment - Now for Moment in (NextKickoff, NextDeadline) if Moment])
+    return "incremental", max(MinimumWait, Wait), Reason
+
+class RefreshScheduler():
+    def __init__(self, Refresher):
+        # Refresher is an AutoScraper, its stages are only ever run from this scheduler
+        self.Refresher = Refresher
+        self.LastFullRefreshGameweek = Refresher.GetLastFullRefreshGameweek()
+        self.Stopped = threading.Event()
+
+    def RunOnce(self):
+        # Refresh what the current point in the gameweek calls for and return the seconds until the next check
+        # Plans are made from fresh event and fixture data, revalidating turns unchanged cached copies into 304s
+        self.Refresher.InvalidateBootstrap(Revalidate=True)
+        self.Refresher.InvalidateFixtures(Revalidate=True)
+        Snapshot = self.Refresher.GetBootstrapSnapshot()
+        Action, Wait, Reason = GetSchedule(Snapshot.Data.get("events", []), self.Refresher.GetFixtures(), time.time(), self.LastFullRefreshGameweek)
+        print(f"Scheduled {Action} refresh, {Reason}")
+        if Action == "full":
+            self.Refresher.RunAll()
+            self.LastFullRefreshGameweek = Snapshot.GetCurrentGameweek()
+            self.Refresher.SetLastFullRefreshGameweek(self.LastFullRefreshGameweek)
+        else:
+            # Prices change daily and new players are added mid-week, unchanged tables are left untouched
+            self.Refresher.RunAll(Incremental=True)
+        return Wait
+
+    def Run(self):
+        while not self.Stopped.is_set():
+            try:
+                Wait = self.RunOnce()
+            except Exception as e:
+                print(f"Scheduled refresh failed: {e}")
+                Wait = RetryInterval
+            print(f"Next scheduled refresh in {int(Wait)} seconds")
+            self.Stopped.wait(Wait)
+
+    def Stop(self):
+        self.Stopped.set()
+
+def AcquireLock(LockPath):
+    # Open and lock LockPath without waiting, returns None when another process already holds it
+    LockFile = open(LockPath, "a+")
+    try:
+        if fcntl:
+            fcntl.flock(LockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            LockFile.seek(0)
+            msvcrt.locking(LockFile.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        LockFile.close()
+        return None
+    return LockFile
+
+def RunScheduler(Refresher, LockPath):
+    # Refresh until interrupted, unless another scheduler already holds the lock, so only one process ever writes on a schedule
+    LockFile = AcquireLock(LockPath)
+    if LockFile is None:
+        print(f"Another scheduler holds {LockPath}, not starting")
+        return False
+    try:
+        RefreshScheduler(Refresher).Run()
+    finally:
+        LockFile.close()
+    return True
+
+if __name__ == "__main__":
+    from app import app, db, FPLSchedulerLock
+    from autoscraper import AutoScraper
+    RunScheduler(AutoScraper(app.app_context(), db.session, Concurrency=int(os.getenv("FPL_SCRAPER_CONCURRENCY", 8))), FPLSchedulerLock)
@@ -1,28 +1,445 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
 import requests
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+# Upstream responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Never go back to the network for a cached response
+IMMUTABLE = float("inf")
+
+class ResponseCache():
+    def __init__(self, CacheDir):
+        # On-disk store of FPL responses keyed by URL, kept with the validators needed to revalidate them
+        self.CacheDir = CacheDir
+        os.makedirs(CacheDir, exist_ok=True)
+
+    def GetPath(self, url):
+        return os.path.join(self.CacheDir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def Get(self, url):
+        try:
+            with open(self.GetPath(url), "r", encoding="utf-8") as File:
+                return json.load(File)
+        except (OSError, ValueError):
+            return None
 
-class Scraper():
-    def __init__(self):
-        self.base = "https://fantasy.premierleague.com/api/"
+    def Put(self, url, Body, ETag=None, LastModified=None, CheckedGameweek=None):
+        # CheckedGameweek is the gameweek whose data was already checked when the body was stored, if any
+        Entry = {"URL": url, "Body": Body, "ETag": ETag, "LastModified": LastModified, "StoredAt": time.time(), "CheckedGameweek": CheckedGameweek}
+        # Write to a temporary file first so concurrent readers never see a half-written entry
+        Handle, TempPath = tempfile.mkstemp(dir=self.CacheDir, suffix=".tmp")
+        with os.fdopen(Handle, "w", encoding="utf-8") as File:
+            json.dump(Entry, File)
+        os.replace(TempPath, self.GetPath(url))
+        return Entry
+
+    def Touch(self, url, Entry, CheckedGameweek=None):
+        # A 304 means the stored body is still current, so restart its freshness window
+        return self.Put(url, Entry["Body"], Entry.get("ETag"), Entry.get("LastModified"), CheckedGameweek)
+
+class RateLimiter():
+    def __init__(self, Rate, Burst=None):
+        # Token bucket shared by every thread, allowing Rate requests a second with bursts of up to Burst
+        self.Rate = Rate
+        self.Capacity = Burst or max(1, Rate)
+        self.Tokens = self.Capacity
+        self.Updated = time.monotonic()
+        self.Lock = threading.Lock()
+
+    def Acquire(self):
+        # Block until a token is free
+        while True:
+            with self.Lock:
+                Now = time.monotonic()
+                self.Tokens = min(self.Capacity, self.Tokens + (Now - self.Updated) * self.Rate)
+                self.Updated = Now
+                if self.Tokens >= 1:
+                    self.Tokens -= 1
+                    return
+                Wait = (1 - self.Tokens) / self.Rate
+            time.sleep(Wait)
+
+class Cassette():
+    def __init__(self, Path, Mode):
+        # Compact gzip JSON recording of FPL responses keyed by API path, either being recorded or replayed
+        if Mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {Mode}")
+        self.Path = Path
+        self.Mode = Mode
+        self.Responses = {}
+        self.Lock = threading.Lock()
+        if Mode == "replay" or os.path.exists(Path):
+            with gzip.open(Path, "rt", encoding="utf-8") as File:
+                self.Responses = json.load(File)["Responses"]
+        if Mode == "record":
+            atexit.register(self.Save)
+
+    @property
+    def Replaying(self):
+        return self.Mode == "replay"
+
+    def Record(self, Path, Body):
+        with self.Lock:
+            self.Responses[Path] = Body
+
+    def Replay(self, Path):
+        if Path not in self.Responses:
+            raise Exception(f"No recorded response for {Path}")
+        return self.Responses[Path]
+
+    def Save(self):
+        with self.Lock:
+            # Sorted keys keep the same recording byte-for-byte identical between saves
+            with gzip.open(self.Path, "wt", encoding="utf-8") as File:
+                json.dump({"Version": 1, "Responses": self.Responses}, File, sort_keys=True, separators=(",", ":"))
+
+# Every Scraper in the process pointing at the same file shares one cassette, so recordings are never overwritten
+Cassettes = {}
+CassettesLock = threading.Lock()
+
+def GetCassette(Path, Mode):
+    with CassettesLock:
+        if Path not in Cassettes:
+            Cassettes[Path] = Cassette(Path, Mode)
+        return Cassettes[Path]
+
+def ParseDeadline(Deadline):
+    # FPL timestamps look like 2024-08-16T17:30:00Z
+    if not Deadline:
+        return None
+    return datetime.fromisoformat(Deadline.replace("Z", "+00:00")).timestamp()
+
+class BootstrapSnapshot():
+    def __init__(self, Data):
+        # One parsed copy of bootstrap-static/ shared by every Scraper method until it expires
+        self.Data = Data
+        self.FetchedAt = time.monotonic()
+
+        # Indexes built once per snapshot so lookups are dictionary hits instead of scans over elements
+        self.PlayersByID = {}
+        self.PlayersByName = {}
+        self.PlayersByTeam = {}
+        self.PlayersByPosition = {}
+        for Player in Data.get('elements', []):
+            self.PlayersByID[Player['id']] = Player
+            # Keep the first player for a web name, matching the order the old linear scans returned
+            self.PlayersByName.setdefault(Player['web_name'].lower(), Player)
+            self.PlayersByTeam.setdefault(Player['team'], []).append(Player)
+            self.PlayersByPosition.setdefault(Player['element_type'], []).append(Player)
+
+        self.TeamsByID = {Team['id']: Team for Team in Data.get('teams', [])}
+        self.EventsByID = {Event['id']: Event for Event in Data.get('events', [])}
+        self.CurrentEvent = next((Event for Event in Data.get('events', []) if Event['is_current']), None)
+        self.NextEvent = next((Event for Event in Data.get('events', []) if Event['is_next']), None)
+
+    def IsFresh(self, TTL):
+        return time.monotonic() - self.FetchedAt < TTL
+
+    def GetPlayer(self, PlayerID):
+        return self.PlayersByID.get(PlayerID)
+
+    def FindPlayerByName(self, PlayerName):
+        # Case-insensitive lookup on the player's web name
+        return self.PlayersByName.get(PlayerName.lower())
+
+    def GetCurrentGameweek(self):
+        return self.CurrentEvent['id'] if self.CurrentEvent else None
+
+    def GetFingerprint(self, PlayerID, Fixtures=None):
+        # Digest of the fields that move when a player's stats need recomputing, including the gameweek
+        # With a FixtureIndex it also covers the team's fixtures, which the team form and next difficulty come from
+        Player = self.GetPlayer(PlayerID)
+        if not Player:
+            return None
+        Summary = "|".join(str(Value) for Value in (
+            self.GetCurrentGameweek(),
+            Player['minutes'],
+            Player['total_points'],
+            Player['status'],
+            Player['event_points'],
+            Player['now_cost'],
+            Fixtures.GetTeamFingerprint(Player['team']) if Fixtures else None,
+        ))
+        return hashlib.sha256(Summary.encode("utf-8")).hexdigest()
+
+class FixtureIndex():
+    def __init__(self, Fixtures):
+        # Fixtures grouped once per fixtures/ download so difficulty lookups never rescan the season
+        self.Fixtures = Fixtures
+        self.FetchedAt = time.monotonic()
+        self.ByTeam = {}
+        self.ByGameweek = {}
+        self.ByTeamGameweek = {}
+        self.TeamFingerprints = {}
+        for Fixture in Fixtures:
+            Gameweek = Fixture['event']
+            self.ByGameweek.setdefault(Gameweek, []).append(Fixture)
+            for TeamID, Opponent, Difficulty, IsHome in (
+                (Fixture['team_h'], Fixture['team_a'], Fixture['team_h_difficulty'], True),
+                (Fixture['team_a'], Fixture['team_h'], Fixture['team_a_difficulty'], False),
+            ):
+                self.ByTeam.setdefault(TeamID, []).append(Fixture)
+                self.ByTeamGameweek.setdefault((TeamID, Gameweek), []).append({
+                    'Difficulty': Difficulty,
+                    'IsHome': IsHome,
+                    'Opponent': Opponent,
+                    'Kickoff': Fixture.get('kickoff_time'),
+                    'Finished': Fixture.get('finished'),
+                })
+
+    def IsFresh(self, TTL):
+        return time.monotonic() - self.FetchedAt < TTL
+
+    def GetTeamFingerprint(self, TeamID):
+        # Every detail of a team's fixtures that its players' stats depend on, so a rescheduled or finished match changes it
+        if TeamID not in self.TeamFingerprints:
+            self.TeamFingerprints[TeamID] = ";".join(
+                f"{Fixture.get('id')},{Fixture['event']},{Fixture.get('kickoff_time')},{Fixture.get('team_h_score')},{Fixture.get('team_a_score')},"
+                f"{Fixture['team_h_difficulty'] if Fixture['team_h'] == TeamID else Fixture['team_a_difficulty']}"
+                for Fixture in self.ByTeam.get(TeamID, []))
+        return self.TeamFingerprints[TeamID]
+
+    def GetTeamFixtures(self, TeamID, Gameweek):
+        return self.ByTeamGameweek.get((TeamID, Gameweek), [])
+
+    def GetDifficulty(self, TeamID, Gameweek):
+        # Difficulty of the team's first fixture in the gameweek, None for a blank gameweek
+        TeamFixtures = self.GetTeamFixtures(TeamID, Gameweek)
+        return TeamFixtures[0]['Difficulty'] if TeamFixtures else None
 
-    def Scrape(self, url):
+class Scraper():
+    def __init__(self, BootstrapTTL=300, FixturesTTL=300, PoolSize=10, Timeout=10, MaxRetries=3, BackoffFactor=0.5, MaxBackoff=30, CacheDir=None, CassettePath=None, CassetteMode=None, RateLimit=None):
+        # FPL_API_BASE points every call at another server, such as the local stand-in in fakefpl.py
+        self.base = os.getenv("FPL_API_BASE", "https://fantasy.premierleague.com/api/")
+        # One keep-alive session shared by every upstream call so connections are reused instead of re-handshaking
+        self.Session = requests.Session()
+        Adapter = HTTPAdapter(pool_connections=PoolSize, pool_maxsize=PoolSize)
+        self.Session.mount("https://", Adapter)
+        self.Session.mount("http://", Adapter)
+        self.Timeout = Timeout
+        # Requests a second allowed upstream across all threads, unlimited when None
+        self.Limiter = RateLimiter(RateLimit) if RateLimit else None
+        self.MaxRetries = MaxRetries
+        self.BackoffFactor = BackoffFactor
+        self.MaxBackoff = MaxBackoff
+        # Seconds a bootstrap-static snapshot is reused before it is downloaded again
+        self.BootstrapTTL = BootstrapTTL
+        self.Bootstrap = None
+        self.BootstrapLock = threading.Lock()
+        # Set by InvalidateBootstrap(Revalidate=True) so the next download skips the disk cache's freshness window
+        self.RevalidateBootstrap = False
+        # Seconds a fixtures/ index is reused before it is downloaded again
+        self.FixturesTTL = FixturesTTL
+        self.FixtureIndex = None
+        self.FixturesLock = threading.Lock()
+        self.RevalidateFixtures = False
+        # Responses persisted across restarts, disabled unless a cache directory is given
+        self.Cache = ResponseCache(CacheDir) if CacheDir else None
+        # Optional recording of every response, or deterministic playback of one without touching the network
+        self.Cassette = GetCassette(CassettePath, CassetteMode) if CassettePath else None
+        # Running totals of upstream traffic, read by the benchmarks
+        self.Counters = {"Requests": 0, "Bytes": 0, "CacheHits": 0, "Replayed": 0}
+        self.CountersLock = threading.Lock()
+        # Callables told about every upstream call as (endpoint path, status code, seconds), used for metrics
+        self.RequestListeners = []
+        # Callables that wrap every task handed to a fetch worker thread, used to credit its calls to the request that made them
+        self.WorkerWrappers = []
+        # Seconds a cached response is served without revalidating, checked in order against the URL path
+        self.FreshnessRules = [
+            (re.compile(r"^bootstrap-static/$"), 60),
+            (re.compile(r"^fixtures/$"), 300),
+            (re.compile(r"^element-summary/\d+/$"), self.GetElementSummaryFreshness),
+            (re.compile(r"^entry/\d+/event/(\d+)/picks/$"), self.GetPicksFreshness),
+            (re.compile(r"^event/(\d+)/live/$"), self.GetLiveFreshness),
+            (re.compile(r"^entry/\d+/$"), 3600),
+            (re.compile(r"^entry/\d+/history/$"), 600),
+            (re.compile(r"^leagues-classic/\d+/standings/"), 300),
+        ]
+
+    def GetEndpointPath(self, url):
+        # The part of an FPL API URL after the base, e.g. element-summary/1/
+        return url[len(self.base):] if url.startswith(self.base) else url
+
+    def Scrape(self, url, Revalidate=False):
+        # Method to fetch data from a given URL, Revalidate checks a cached copy with the server even while it is fresh
+        if self.Cassette and self.Cassette.Replaying:
+            self.Count("Replayed")
+            return self.Cassette.Replay(self.GetEndpointPath(url))
+        Body = self.Fetch(url, Revalidate)
+        if self.Cassette:
+            self.Cassette.Record(self.GetEndpointPath(url), Body)
+        return Body
+
+    def Fetch(self, url, Revalidate=False):
         try: 
-            # Method to fetch data from a given URL
-            response = requests.get(url)
+            # Serve from the disk cache or the network
+            Entry = self.Cache.Get(url) if self.Cache else None
+            if Entry and not Revalidate and self.IsCacheEntryFresh(url, Entry):
+                self.Count("CacheHits")
+                return Entry["Body"]
+
+            # Revalidate a stale entry with a conditional request instead of downloading it again
+            Headers = {}
+            if Entry and Entry.get("ETag"):
+                Headers["If-None-Match"] = Entry["ETag"]
+            if Entry and Entry.get("LastModified"):
+                Headers["If-Modified-Since"] = Entry["LastModified"]
+
+            response = self.Get(url, Headers)
+            if response.status_code == 304 and Entry:
+                self.Count("CacheHits")
+                self.Cache.Touch(url, Entry, self.GetCheckedGameweek())
+                return Entry["Body"]
             if response.status_code == 200:
-                return response.json()
+                Body = response.json()
+                if self.Cache:
+                    self.Cache.Put(url, Body, response.headers.get("ETag"), response.headers.get("Last-Modified"), self.GetCheckedGameweek())
+                return Body
             else:
                 raise Exception(f"Failed to fetch data: {response.status_code}")
         except ValueError:
             raise ValueError("Invalid JSON response")
+
+    def IsCacheEntryFresh(self, url, Entry):
+        Path = self.GetEndpointPath(url)
+        for Pattern, Freshness in self.FreshnessRules:
+            Match = Pattern.match(Path)
+            if Match:
+                if callable(Freshness):
+                    Freshness = Freshness(Match, Entry)
+                return time.time() - Entry["StoredAt"] < Freshness
+        return False
+
+    def GetCheckedGameweek(self):
+        # The current gameweek when the held snapshot says its data has been checked, otherwise None
+        Snapshot = self.Bootstrap
+        if Snapshot and Snapshot.CurrentEvent and Snapshot.CurrentEvent.get('data_checked'):
+            return Snapshot.CurrentEvent['id']
+        return None
+
+    def GetElementSummaryFreshness(self, Match, Entry):
+        # Once the current gameweek's data is checked, player histories only change again at the next deadline
+        CheckedGameweek = self.GetCheckedGameweek()
+        if CheckedGameweek:
+            # Entries stored before the check may hold live, partial histories, so they're revalidated every time
+            if Entry.get("CheckedGameweek") != CheckedGameweek:
+                return 0
+            NextDeadline = ParseDeadline(self.Bootstrap.NextEvent['deadline_time']) if self.Bootstrap.NextEvent else None
+            if NextDeadline is None:
+                return IMMUTABLE
+            return NextDeadline - Entry["StoredAt"]
+        return 300
+
+    def GetPicksFreshness(self, Match, Entry):
+        # Picks for a gameweek that has already passed can never change
+        CurrentGameweek = self.Bootstrap.GetCurrentGameweek() if self.Bootstrap else None
+        if CurrentGameweek and int(Match.group(1)) < CurrentGameweek:
+            return IMMUTABLE
+        return 60
+
+    def GetLiveFreshness(self, Match, Entry):
+        # Live points for a finished and checked gameweek are final
+        Event = self.Bootstrap.EventsByID.get(int(Match.group(1))) if self.Bootstrap else None
+        if Event and Event.get('finished') and Event.get('data_checked'):
+            return IMMUTABLE
+        return 30
+
+    def Get(self, url, Headers=None):
+        # Send a GET through the pooled session, retrying connection errors, 429 and 5xx with jittered backoff
+        for Attempt in range(self.MaxRetries + 1):
+            if self.Limiter:
+                self.Limiter.Acquire()
+            Start = time.perf_counter()
+            try:
+                response = self.Session.get(url, headers=Headers, timeout=self.Timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self.Count("Requests")
+                self.NotifyListeners(url, "error", time.perf_counter() - Start)
+                if Attempt == self.MaxRetries:
+                    raise
+                time.sleep(self.GetRetryDelay(Attempt))
+                continue
+            self.Count("Requests")
+            self.Count("Bytes", len(response.content))
+            self.NotifyListeners(url, response.status_code, time.perf_counter() - Start)
+
+            if response.status_code in RETRY_STATUSES and Attempt < self.MaxRetries:
+                time.sleep(self.GetRetryDelay(Attempt, response.headers.get("Retry-After")))
+                continue
+            return response
+
+    def NotifyListeners(self, url, StatusCode, Seconds):
+        for Listener in self.RequestListeners:
+            Listener(self.GetEndpointPath(url), StatusCode, Seconds)
+
+    def BindWorker(self, Function):
+        # Wrap Function for a worker thread, in the thread that submits the work so its context can be captured
+        for Wrapper in self.WorkerWrappers:
+            Function = Wrapper(Function)
+        return Function
+
+    def Count(self, Name, Amount=1):
+        with self.CountersLock:
+            self.Counters[Name] += Amount
+
+    def GetRetryDelay(self, Attempt, RetryAfter=None):
+        # Full jitter exponential backoff, never shorter than the server's Retry-After
+        Delay = random.uniform(0, min(self.MaxBackoff, self.BackoffFactor * 2 ** Attempt))
+        if RetryAfter and RetryAfter.isdigit():
+            Delay = max(Delay, min(self.MaxBackoff, int(RetryAfter)))
+        return Delay
         
+    def GetBootstrapSnapshot(self) -> BootstrapSnapshot:
+        # Return the shared bootstrap-static snapshot, downloading it again only once the TTL has passed
+        with self.BootstrapLock:
+            if self.Bootstrap is None or not self.Bootstrap.IsFresh(self.BootstrapTTL):
+                self.Bootstrap = BootstrapSnapshot(self.Scrape(f"{self.base}bootstrap-static/", self.RevalidateBootstrap))
+                self.RevalidateBootstrap = False
+            return self.Bootstrap
+
+    def GetBootstrapStatic(self) -> dict:
+        # Get the bootstrap-static document from the shared snapshot
+        return self.GetBootstrapSnapshot().Data
+
+    def InvalidateBootstrap(self, Revalidate=False):
+        # Drop the shared snapshot so the next lookup fetches bootstrap-static again
+        # Revalidate also sends that fetch to the server, where the disk cache would otherwise serve a copy up to a minute old
+        with self.BootstrapLock:
+            self.Bootstrap = None
+            self.RevalidateBootstrap = self.RevalidateBootstrap or Revalidate
+
+    def GetFixtureIndex(self) -> FixtureIndex:
+        # Return the shared fixture index, downloading fixtures again only once the TTL has passed
+        with self.FixturesLock:
+            if self.FixtureIndex is None or not self.FixtureIndex.IsFresh(self.FixturesTTL):
+                self.FixtureIndex = FixtureIndex(self.Scrape(f"{self.base}fixtures/", self.RevalidateFixtures))
+                self.RevalidateFixtures = False
+            return self.FixtureIndex
+
+    def InvalidateFixtures(self, Revalidate=False):
+        # Drop the shared index so the next lookup fetches fixtures again, Revalidate skips the disk cache's five minute window
+        with self.FixturesLock:
+            self.FixtureIndex = None
+            self.RevalidateFixtures = self.RevalidateFixtures or Revalidate
+
     def GetPlayerStats(self, PlayerID:int) -> dict:
         # Get player stats for a specific player
-        url = f"{self.base}bootstrap-static/"
-        data = self.Scrape(url)
-        Elements = data['elements']
-        CurrentGameweek = next((event['id'] for event in data['events'] if event['is_current']), None)
+        Snapshot = self.GetBootstrapSnapshot()
+        CurrentGameweek = Snapshot.GetCurrentGameweek()
 
-        Player = next((Player for Player in Elements if Player['id'] == PlayerID), None)
+        Player = Snapshot.GetPlayer(PlayerID)
 
         if not Player:
             raise ValueError(f"Player with ID {PlayerID} not found")
@@ -41,7 +458,13 @@ class Scraper():
             Saves = -1  
             PenaltySaves = -1  
         PlayerName = Player['web_name']
-        LastSeasonData = self.GetPlayerLastSeasonData(PlayerName)
+        # One element-summary download serves both the recent form and last season lookups
+        GameweekData = self.GetPlayerGameweekData(Player['id'])
+        RecentData = self.GetRecentPlayerData(Player['id'], GameweekData)
+        if self.GetLastSeasonPlayerID(PlayerName) == Player['id']:
+            LastSeasonData = self.GetPlayerLastSeasonData(PlayerName, GameweekData)
+        else:
+            LastSeasonData = self.GetPlayerLastSeasonData(PlayerName)
 
         #Checks if the player played in the premier league last season
         if LastSeasonData:
@@ -66,9 +489,9 @@ class Scraper():
             'Points': Player['total_points'],
             'xG': Player['expected_goals'],
             'xA': Player['expected_assists'],
-            'RecentGoals': self.GetRecentPlayerData(Player['id'])['RecentGoals'],
-            'RecentAssists': self.GetRecentPlayerData(Player['id'])['RecentAssists'],
-            'RecentPoints': self.GetRecentPlayerData(Player['id'])['RecentPoints'],
+            'RecentGoals': RecentData['RecentGoals'],
+            'RecentAssists': RecentData['RecentAssists'],
+            'RecentPoints': RecentData['RecentPoints'],
             'CleanSheets': Player['clean_sheets'],
             'Saves': Saves,
             'PenaltySaves': PenaltySaves,
@@ -80,42 +503,57 @@ class Scraper():
             'LastSeasonGoals': LastSeasonGoals,
             'LastSeasonAssists': LastSeasonAssists,
             'LastSeasonCleanSheets': LastSeasonCleanSheets,
+            'Minutes': Player['minutes'],
+            'GoalsConceded': Player['goals_conceded'],
+            'Bonus': Player['bonus'],
+            'Bps': Player['bps'],
+            'ICTIndex': Player['ict_index'],
+            'Starts': Player['starts'],
+            'xGC': Player['expected_goals_conceded'],
         }
 
         return PlayerStats
+
+    def FetchPlayerStats(self, PlayerIDs, Concurrency=8):
+        # Fetch stats for many players on a bounded thread pool, yielding (PlayerID, PlayerStats, Error) as each one finishes
+        # Warm the shared snapshots first so the workers only download element-summary documents
+        self.GetBootstrapSnapshot()
+        self.GetFixtureIndex()
+        with ThreadPoolExecutor(max_workers=Concurrency) as Executor:
+            GetPlayerStats = self.BindWorker(self.GetPlayerStats)
+            Futures = {Executor.submit(GetPlayerStats, PlayerID): PlayerID for PlayerID in PlayerIDs}
+            for Future in as_completed(Futures):
+                try:
+                    yield Futures[Future], Future.result(), None
+                except Exception as e:
+                    yield Futures[Future], None, e
     
     def GetRealTeams(self):
         # Get the real teams from the FPL API
-        url = f"{self.base}bootstrap-static/"
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise Exception(f"Failed to fetch data: {response.status_code}")
-        data = response.json()
-        TeamsData = data['teams']
-        Teams = {Team['id']: Team['name'] for Team in TeamsData}
+        TeamsData = self.GetBootstrapSnapshot().TeamsByID
+        Teams = {TeamID: Team['name'] for TeamID, Team in TeamsData.items()}
         return Teams
     
     def GetLastSeasonPlayerID(self, PlayerName):
         # Get the player ID for a certain player from last season (they change every season for each player)
-        url = f"{self.base}bootstrap-static/"
-        response = requests.get(url)
-        LastSeasonData = self.Scrape(url)
-        if response.status_code != 200:
-            raise Exception(f"Failed to fetch data: {response.status_code}")
-        for player in LastSeasonData.get("elements", []):
-            if player.get("web_name").lower() == PlayerName.lower():
-                return player.get("id")
+        Player = self.GetBootstrapSnapshot().FindPlayerByName(PlayerName)
+        if Player:
+            return Player.get("id")
         raise Exception(f"Player '{PlayerName}' not found in last season's data")
 
 
-    def GetPlayerLastSeasonData(self, PlayerName):
+    def GetPlayerLastSeasonData(self, PlayerName, GameweekData=None):
         # Get the player stats for a specific player from last season
             LastSeasonPlayerID = self.GetLastSeasonPlayerID(PlayerName)
             if LastSeasonPlayerID:
                 url = f"{self.base}element-summary/{LastSeasonPlayerID}/"
-                response = requests.get(url)
-                if response.status_code == 200:
-                    data = response.json()
+                data = GameweekData
+                if data is None:
+                    try:
+                        data = self.Scrape(url)
+                    except Exception:
+                        data = None
+                if data:
                     for season in data.get('history_past', []):
                         if season.get('season_name') == '2023/24':
                             #print(season)
@@ -131,24 +569,17 @@ class Scraper():
         
     def GetFixtures(self):
         # Get the fixtures for the current season
-        url = f"{self.base}fixtures/"
-        return self.Scrape(url)
+        return self.GetFixtureIndex().Fixtures
     
     def GetPlayerID(self, PlayerName):
         # Get the player ID for a specific player
-        url = f"{self.base}bootstrap-static/"
-        response = requests.get(url)
-        if response.status_code == 200:
-            Players = response.json()["elements"]
-            for Player in Players:
-                if Player["web_name"] == PlayerName:
-                    return f"{PlayerName}'s ID: {Player['id']}"
+        Player = self.GetBootstrapSnapshot().FindPlayerByName(PlayerName)
+        if Player:
+            return f"{PlayerName}'s ID: {Player['id']}"
 
     def GetGeneralPlayerData(self):
         # Get general player data for the current season
-        url = f"{self.base}bootstrap-static/"
-        response = requests.get(url)
-        data = response.json()
+        data = self.GetBootstrapStatic()
         Elements = data['elements']
 
         Players = []
@@ -165,17 +596,12 @@ class Scraper():
 
     def GetTeamRecentPoints(self, TeamID):
         # Get the recent points for a specific team
-        url = f"{self.base}fixtures/"
-        response = requests.get(url)
-        data = response.json()
-        if response.status_code != 200:
-            raise Exception(f"Failed to fetch data: {response.status_code}")
-        Fixtures = self.Scrape(url)
-        if data: 
+        Index = self.GetFixtureIndex()
+        if Index.Fixtures: 
             CurrentGameweek = self.GetCurrentGameweek()
         else:
             raise ValueError("No fixtures found")
-        TeamFixtures = [Fixture for Fixture in Fixtures if Fixture['team_h'] == TeamID or Fixture['team_a'] == TeamID]
+        TeamFixtures = Index.ByTeam.get(TeamID, [])
         if TeamFixtures:
             RecentFixtures = TeamFixtures[CurrentGameweek-5:CurrentGameweek]  
             TeamRecentPoints = 0
@@ -207,35 +633,22 @@ class Scraper():
         CurrentGameweek = self.GetCurrentGameweek()
         NextGameweek = CurrentGameweek+1
 
-        Fixtures = self.GetFixtures()
-        NextGameweekFixture = [Fixture for Fixture in Fixtures if Fixture['event'] == NextGameweek]
-        if NextGameweekFixture:
-            for Fixture in NextGameweekFixture:
-                RealTeams = self.GetRealTeams()
-                # Checking if the team is playing at home or away
-                if Fixture['team_h'] == TeamID:
-                    return Fixture['team_h_difficulty']
-                elif Fixture['team_a'] == TeamID:
-                    return Fixture['team_a_difficulty']
+        Index = self.GetFixtureIndex()
+        if NextGameweek in Index.ByGameweek:
+            # The index already knows whether the team is playing at home or away
+            return Index.GetDifficulty(TeamID, NextGameweek)
         else:
             raise ValueError(f"No fixtures found for Gameweek {NextGameweek}")
                 
     def GetNextManagerFixtureDifficulty(self, TeamID: int, Gameweek: int) -> int:
         # Get the next fixture difficulty for a specific team
-        Fixtures = self.GetFixtures()
-        GameweekFixture = [Fixture for Fixture in Fixtures if Fixture['event'] == Gameweek]
+        return self.GetFixtureIndex().GetDifficulty(TeamID, Gameweek)
 
-        if GameweekFixture:
-            for Fixture in GameweekFixture:
-                if Fixture['team_h'] == TeamID:
-                    return Fixture['team_h_difficulty']
-                elif Fixture['team_a'] == TeamID:
-                    return Fixture['team_a_difficulty']
-
-    def GetRecentPlayerData(self, PlayerID: int):
+    def GetRecentPlayerData(self, PlayerID: int, GameweekData=None):
         # Get the recent player data for a specific player  
         CurrentGameweek = self.GetCurrentGameweek()
-        GameweekData = self.GetPlayerGameweekData(PlayerID)
+        if GameweekData is None:
+            GameweekData = self.GetPlayerGameweekData(PlayerID)
         PlayerRecentPoints = 0
         PlayerRecentGoals = 0
         PlayerRecentAssists = 0
@@ -258,41 +671,28 @@ class Scraper():
     
     def GetPlayerGameweekData(self, PlayerID):
         # Get the gameweek data for a specific player
-        url = f"{self.base}element-summary/{PlayerID}"
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise Exception(f"Failed to fetch data: {response.status_code}")
-        data = response.json()
-        return data
+        url = f"{self.base}element-summary/{PlayerID}/"
+        return self.Scrape(url)
     
     def GetPlayerID(self, PlayerName: int):
         # Get the player ID for a specific player
-        url = f"{self.base}bootstrap-static/"
-        response = requests.get(url)
-        if response.status_code == 200:
-            Players = response.json()["elements"]
-            for Player in Players:
-                if Player["web_name"] == PlayerName:
-                    return Player['id']
+        Player = self.GetBootstrapSnapshot().FindPlayerByName(PlayerName)
+        if Player:
+            return Player['id']
         raise Exception(f"Player '{PlayerName}' not found") 
 
     def CheckPlayerStatus(self, PlayerID: int) -> str:
         # Check the status of a specific player
         url = f"{self.base}element-summary/{PlayerID}/"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            if "status" in data:
-                return data['status']
-            else:
-                raise ValueError(f"Status not found for Player ID {PlayerID}")
+        data = self.Scrape(url)
+        if "status" in data:
+            return data['status']
         else:
-            raise Exception(f"Failed to fetch data: {response.status_code}")
+            raise ValueError(f"Status not found for Player ID {PlayerID}")
 
     def GetNextDoubleGameweek(self):
         # Get the next double gameweek from FPL API
-        url = f"{self.base}fixtures/"
-        AllFixtures = self.Scrape(url)
+        AllFixtures = self.GetFixtures()
         
         TeamGameweekCounts = {}
 
@@ -321,32 +721,82 @@ class Scraper():
     
     def GetCurrentGameweek(self) -> int:
         # Get the current gameweek from FPL API
-        url = f"{self.base}bootstrap-static/"
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise Exception(f"Failed to fetch data from FPL API: {response.status_code}")
-        data = response.json()
-        CurrentGameweek = next((event['id'] for event in data['events'] if event['is_current']), None)
+        CurrentGameweek = self.GetBootstrapSnapshot().GetCurrentGameweek()
         if CurrentGameweek:
             return CurrentGameweek
         raise Exception("Current gameweek not found in the response")
     def GetTeamName(self, TeamID: int):
         # Get the team name for a specific team ID
         url = f"{self.base}entry/{TeamID}/"
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise Exception(f"Failed to fetch data from FPL API: {response.status_code}")
-        data = response.json()
+        data = self.Scrape(url)
         TeamName = data.get("name")  
         return TeamName
 
+    def GetTeamPicks(self, TeamID: int, Gameweek: int) -> dict:
+        # Get a manager's picks for a specific gameweek
+        url = f"{self.base}entry/{TeamID}/event/{Gameweek}/picks/"
+        return self.Scrape(url)
+
+    def FetchTeamPicks(self, TeamIDs, Gameweek, Concurrency=8):
+        # Fetch many managers' picks on a bounded thread pool, yielding (TeamID, Picks, Error) as each one finishes
+        with ThreadPoolExecutor(max_workers=Concurrency) as Executor:
+            GetTeamPicks = self.BindWorker(self.GetTeamPicks)
+            Futures = {Executor.submit(GetTeamPicks, TeamID, Gameweek): TeamID for TeamID in TeamIDs}
+            for Future in as_completed(Futures):
+                try:
+                    yield Futures[Future], Future.result(), None
+                except Exception as e:
+                    yield Futures[Future], None, e
+
+    def GetTeamHistory(self, TeamID: int) -> dict:
+        # Get a manager's season history, including the chips they have played
+        url = f"{self.base}entry/{TeamID}/history/"
+        return self.Scrape(url)
+
+    def FetchTeamHistories(self, TeamIDs, Concurrency=8):
+        # Fetch many managers' histories on a bounded thread pool, yielding (TeamID, History, Error) as each one finishes
+        with ThreadPoolExecutor(max_workers=Concurrency) as Executor:
+            GetTeamHistory = self.BindWorker(self.GetTeamHistory)
+            Futures = {Executor.submit(GetTeamHistory, TeamID): TeamID for TeamID in TeamIDs}
+            for Future in as_completed(Futures):
+                try:
+                    yield Futures[Future], Future.result(), None
+                except Exception as e:
+                    yield Futures[Future], None, e
+
+    def GetLeagueStandingsPage(self, LeagueID: int, Page: int = 1) -> dict:
+        # Get one page of 50 entries from a classic league's standings
+        url = f"{self.base}leagues-classic/{LeagueID}/standings/?page_standings={Page}"
+        return self.Scrape(url)
+
+    def FetchLeagueStandings(self, LeagueID, Concurrency=8, MaxPages=20):
+        # Get a classic league, its standings rows and whether pages beyond MaxPages were left out
+        # The pages after the first are fetched Concurrency at a time
+        FirstPage = self.GetLeagueStandingsPage(LeagueID, 1)
+        Results = list(FirstPage["standings"]["results"])
+        HasNext = FirstPage["standings"]["has_next"]
+        NextPage = 2
+        GetPage = self.BindWorker(lambda Page: self.GetLeagueStandingsPage(LeagueID, Page))
+        with ThreadPoolExecutor(max_workers=Concurrency) as Executor:
+            while HasNext and NextPage <= MaxPages:
+                # The page count isn't known up front, so a batch can overshoot by a few empty pages
+                Pages = list(range(NextPage, min(NextPage + Concurrency, MaxPages + 1)))
+                for Page in Executor.map(GetPage, Pages):
+                    Results.extend(Page["standings"]["results"])
+                    HasNext = Page["standings"]["has_next"]
+                    if not HasNext:
+                        break
+                NextPage = Pages[-1] + 1
+        return FirstPage["league"], Results, HasNext
+
+    def GetLiveEvent(self, Gameweek: int) -> dict:
+        # Get every player's points, minutes and BPS so far in a gameweek, in one document
+        url = f"{self.base}event/{Gameweek}/live/"
+        return self.Scrape(url)
+
     def GetLastGameweekPoints(self, PlayerID: int) -> int:
         # Get the last gameweek points for a specific player
-        url = f"{self.base}bootstrap-static/"
-        response = requests.get(url)
-        data = response.json()
-
-        Player = next((p for p in data['elements'] if p['id'] == PlayerID), None)
+        Player = self.GetBootstrapSnapshot().GetPlayer(PlayerID)
 
         if Player:
             return Player['event_points']
@@ -386,14 +836,15 @@ class Scraper():
         NextThreeFixtureDifficultyAvg = 999
         EasiestFixtureTeam = None
         TeamNextThreeFixturesDifficulty = 0
-        for Team in RealTeams.query.all():
-            RealTeam = RealTeams.query.filter_by(TeamID=Team.TeamID).first()
+        # Build the fixture index up front so the 60 difficulty lookups below all run from memory
+        Index = self.GetFixtureIndex()
+        for RealTeam in RealTeams.query.all():
             Matches = 0 
             if RealTeam:
                 TeamNextThreeFixtureDifficultyAvg = 0  
                 for i in range(1, 4):
                     Gameweek = CurrentGameweek + i
-                    Difficulty = scraper.GetNextManagerFixtureDifficulty(RealTeam.TeamID, Gameweek)
+                    Difficulty = Index.GetDifficulty(RealTeam.TeamID, Gameweek)
 
                     if Difficulty is None:
                         TeamNextThreeFixturesDifficulty += 0
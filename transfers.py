@@ -0,0 +1,198 @@
+#Transfer suggestions scored over a whole position at once
+#A position's stats are held as NumPy columns so the filters and the rank-sum score are computed in one pass
+from collections import defaultdict
+from itertools import combinations
+import numpy as np
+
+# 4 - Forward, 3 - Midfielder, 2 - Defender, 1 - Goalkeeper
+# Stats where a higher value earns a better (lower) rank
+RankedStats = {
+    4: ("RecentPoints", "xG", "xA", "RecentGoals", "RecentAssists", "TeamRecentPoints"),
+    3: ("RecentPoints", "xG", "xA", "RecentGoals", "RecentAssists", "TeamRecentPoints"),
+    2: ("RecentPoints", "xG", "xA", "CleanSheets", "RecentGoals", "RecentAssists", "TeamRecentPoints"),
+    1: ("RecentPoints", "Saves", "PenaltySaves", "Minutes", "GoalsConceded"),
+}
+# Stats where a lower value earns a better rank
+AscendingStats = {
+    4: (),
+    3: (),
+    2: (),
+    1: ("YellowCards", "RedCards"),
+}
+# Every stat with a rank column in PlayerRankings
+AllRankedStats = sorted({StatName for Stats in list(RankedStats.values()) + list(AscendingStats.values()) for StatName in Stats})
+# A candidate must at least match the outgoing player on each of these
+Thresholds = {
+    4: ("RecentPoints", "RecentGoals"),
+    3: ("RecentPoints", "RecentAssists"),
+    2: ("RecentPoints", "CleanSheets"),
+    1: ("RecentPoints",),
+}
+
+class PositionColumns():
+    def __init__(self, Position, Rows):
+        # Rows are dicts with PlayerID, Name, TeamID, Price, Injured, Suspended and every stat the position uses
+        self.Position = Position
+        # Sorted by PlayerID so tied ranks fall the same way as the per-player sorts they replace
+        Rows = sorted(Rows, key=lambda Row: Row["PlayerID"])
+        self.Names = [Row["Name"] for Row in Rows]
+        self.PlayerIDs = np.array([Row["PlayerID"] for Row in Rows], dtype=np.int64)
+        self.TeamIDs = np.array([Row["TeamID"] for Row in Rows], dtype=np.int64)
+        self.Prices = np.array([Row["Price"] for Row in Rows], dtype=np.float64)
+        self.Available = np.array([not (Row["Injured"] or Row["Suspended"]) for Row in Rows], dtype=bool)
+        self.Difficulty = np.array([Row["NextFixtureDifficulty"] or 0 for Row in Rows], dtype=np.float64)
+        self.Stats = {}
+        for StatName in set(RankedStats[Position] + AscendingStats[Position] + Thresholds[Position]):
+            self.Stats[StatName] = np.array([Row[StatName] or 0 for Row in Rows], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.PlayerIDs)
+
+def GetRanks(Values, Descending=True):
+    # 1-based position of each value in a stable sort, matching enumerate(sorted(...)) + 1
+    Order = np.argsort(-Values if Descending else Values, kind="stable")
+    Ranks = np.empty(len(Values), dtype=np.int64)
+    Ranks[Order] = np.arange(1, len(Values) + 1)
+    return Ranks
+
+def RankColumns(Columns, Indexes):
+    # Rank-sum score of the players at Indexes, ranked only against each other, with each stat's ranks
+    Ranks = {}
+    for StatName in RankedStats[Columns.Position]:
+        Ranks[StatName] = GetRanks(Columns.Stats[StatName][Indexes])
+    for StatName in AscendingStats[Columns.Position]:
+        Ranks[StatName] = GetRanks(Columns.Stats[StatName][Indexes], Descending=False)
+    Scores = Columns.Difficulty[Indexes] + sum(Ranks.values())
+    return Ranks, Scores
+
+def GetRankingRows(Columns):
+    # One row per player ranked against their whole position, for the PlayerRankings table
+    Ranks, Scores = RankColumns(Columns, np.arange(len(Columns)))
+    Rows = []
+    for Index, PlayerID in enumerate(Columns.PlayerIDs):
+        Row = {"PlayerID": int(PlayerID), "Position": Columns.Position, "Score": float(Scores[Index])}
+        for StatName in AllRankedStats:
+            Row[f"{StatName}Rank"] = int(Ranks[StatName][Index]) if StatName in Ranks else None
+        Rows.append(Row)
+    return Rows
+
+def SuggestTransfers(Columns, PlayerOutStats, Budget, ExcludedIDs=(), FullTeamIDs=(), TopK=5):
+    # PlayerOutStats is the outgoing player's PlayerStats row, returns up to TopK (PlayerID, Name, Score) tuples, best first, lower scores being better
+    Position = Columns.Position
+    Mask = Columns.Available & (Columns.Prices <= float(Budget))
+    Mask &= ~np.isin(Columns.PlayerIDs, np.fromiter(ExcludedIDs, dtype=np.int64))
+    Mask &= ~np.isin(Columns.TeamIDs, np.fromiter(FullTeamIDs, dtype=np.int64))
+    for StatName in Thresholds[Position]:
+        Mask &= Columns.Stats[StatName] >= (getattr(PlayerOutStats, StatName) or 0)
+
+    Candidates = np.flatnonzero(Mask)
+    if len(Candidates) == 0:
+        return []
+
+    _, Scores = RankColumns(Columns, Candidates)
+    Best = np.argsort(Scores, kind="stable")[:TopK]
+    return [(int(Columns.PlayerIDs[Candidates[Index]]), Columns.Names[Candidates[Index]], float(Scores[Index])) for Index in Best]
+
+def GetCandidateLists(ColumnsByPosition, ExcludedIDs=(), MaxTransfers=3, TopK=20, Projection="RecentPoints"):
+    # Per position, the best TopK available players as (Projection, Price, TeamID, PlayerID, Name), best first
+    # A player is dropped when MaxTransfers clubmates are at least as good for no more money, since a plan could always use one of those instead
+    Candidates = {}
+    for Position, Columns in ColumnsByPosition.items():
+        Mask = Columns.Available & ~np.isin(Columns.PlayerIDs, np.fromiter(ExcludedIDs, dtype=np.int64))
+        Indexes = np.flatnonzero(Mask)
+        Projections = Columns.Stats[Projection][Indexes]
+        Prices = Columns.Prices[Indexes]
+        # Best projection first and the cheapest first among equals, so every possible dominator is seen before the players it dominates
+        Order = Indexes[np.lexsort((Prices, -Projections))]
+
+        Kept = []
+        KeptByTeam = {}
+        for Index in Order:
+            TeamID = int(Columns.TeamIDs[Index])
+            Price = float(Columns.Prices[Index])
+            Dominators = sum(1 for KeptPrice in KeptByTeam.get(TeamID, []) if KeptPrice <= Price)
+            if Dominators >= MaxTransfers:
+                continue
+            KeptByTeam.setdefault(TeamID, []).append(Price)
+            Kept.append((float(Columns.Stats[Projection][Index]), Price, TeamID, int(Columns.PlayerIDs[Index]), Columns.Names[Index]))
+            if len(Kept) == TopK:
+                break
+        Candidates[Position] = Kept
+    return Candidates
+
+def PlanTransfers(Squad, Candidates, Bank, FreeTransfers=1, MaxTransfers=3, HitCost=4, MaxPerClub=3):
+    # Squad is a list of dicts with PlayerID, Name, Position, TeamID, Price and Projection for the current 15
+    # Returns the best plan for each number of transfers from 1 to MaxTransfers, searched branch and bound
+    Plans = []
+    for TransferCount in range(1, MaxTransfers + 1):
+        Best = {"Gain": 0.0, "Out": None, "In": None}
+        Evaluated = 0
+
+        OutSets = []
+        for OutIndexes in combinations(range(len(Squad)), TransferCount):
+            # Fill slots a position at a time, so repeated positions can be kept in candidate order and skip permutations
+            Outs = sorted((Squad[Index] for Index in OutIndexes), key=lambda Player: Player["Position"])
+            Slots = [Candidates.get(Player["Position"], []) for Player in Outs]
+            if not all(Slots):
+                continue
+            OutProjection = sum(Player["Projection"] for Player in Outs)
+            # The best candidate in every slot gives an upper bound on what this set of sales could gain
+            Bound = sum(Slot[0][0] for Slot in Slots) - OutProjection
+            OutSets.append((Bound, Outs, Slots, OutProjection))
+        OutSets.sort(key=lambda OutSet: OutSet[0], reverse=True)
+
+        for Bound, Outs, Slots, OutProjection in OutSets:
+            if Best["Out"] is not None and Bound <= Best["Gain"]:
+                break
+            OutIDs = {Player["PlayerID"] for Player in Outs}
+            # Sale prices are taken as current prices since the public picks endpoint has no purchase prices
+            Funds = Bank + sum(Player["Price"] for Player in Outs)
+            TeamCounts = defaultdict(int)
+            for Player in Squad:
+                if Player["PlayerID"] not in OutIDs:
+                    TeamCounts[Player["TeamID"]] += 1
+            RemainingBest = [sum(Slot[0][0] for Slot in Slots[Depth:]) for Depth in range(len(Slots))] + [0.0]
+            RemainingCheapest = [sum(min(Candidate[1] for Candidate in Slot) for Slot in Slots[Depth:]) for Depth in range(len(Slots))] + [0.0]
+
+            def Search(Depth, Projection, Cost, Chosen, Start):
+                nonlocal Evaluated
+                if Depth == len(Slots):
+                    Evaluated += 1
+                    Gain = Projection - OutProjection
+                    if Best["Out"] is None or Gain > Best["Gain"]:
+                        Best.update(Gain=Gain, Out=list(Outs), In=list(Chosen))
+                    return
+                Slot = Slots[Depth]
+                for Index in range(Start, len(Slot)):
+                    CandidateProjection, Price, TeamID, PlayerID, Name = Slot[Index]
+                    # Candidates are best first, so once this one can't beat the best plan none after it can
+                    if Best["Out"] is not None and Projection + CandidateProjection + RemainingBest[Depth + 1] - OutProjection <= Best["Gain"]:
+                        break
+                    if Cost + Price + RemainingCheapest[Depth + 1] > Funds + 1e-9:
+                        continue
+                    if TeamCounts[TeamID] >= MaxPerClub or any(PlayerID == Player[3] for Player in Chosen):
+                        continue
+                    TeamCounts[TeamID] += 1
+                    Chosen.append(Slot[Index])
+                    SameSlotNext = Depth + 1 < len(Slots) and Slots[Depth + 1] is Slot
+                    Search(Depth + 1, Projection + CandidateProjection, Cost + Price, Chosen, Index + 1 if SameSlotNext else 0)
+                    Chosen.pop()
+                    TeamCounts[TeamID] -= 1
+
+            Search(0, 0.0, 0.0, [], 0)
+
+        if Best["Out"] is None:
+            continue
+        Hit = HitCost * max(0, TransferCount - FreeTransfers)
+        Spent = sum(Candidate[1] for Candidate in Best["In"]) - sum(Player["Price"] for Player in Best["Out"])
+        Plans.append({
+            "Transfers": TransferCount,
+            "Out": [Player["Name"] for Player in Best["Out"]],
+            "In": [Candidate[4] for Candidate in Best["In"]],
+            "Gain": round(Best["Gain"], 2),
+            "Hit": Hit,
+            "NetGain": round(Best["Gain"] - Hit, 2),
+            "Bank": round(Bank - Spent, 1),
+            "Evaluated": Evaluated,
+        })
+    return Plans